@@ -4,6 +4,7 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import login_user, logout_user, current_user, login_required
 from sqlalchemy import select
 from models_core import get_session, User
+from services.identity_cache import identity_cache
 
 
 bp = Blueprint("auth", __name__, url_prefix="/auth")
@@ -53,6 +54,8 @@ def signup():
         user = User(email=email, password_hash=generate_password_hash(password))
         db.add(user)
         db.commit()
+        # Drop any cached identity for this id (see services/identity_cache.py).
+        identity_cache.invalidate(user.id)
 
         login_user(user)
         return redirect(url_for("home"))
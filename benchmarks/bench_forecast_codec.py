@@ -0,0 +1,86 @@
+# benchmarks/bench_forecast_codec.py
+# services/forecast_codec vs JSON for a cached Open-Meteo forecast:
+# round-trip check, stored size, in-memory size and encode/decode time.
+#
+#   python -m benchmarks.bench_forecast_codec [--days 7] [--number 2000]
+
+import argparse
+import gzip
+import json
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+from benchmarks.bench_forecast_frame import make_payload
+from services.forecast_codec import encode, decode, EncodedForecast
+
+
+def full_payload(days=7, seed=1):
+    """make_payload plus the metadata, units and daily fields the real response has."""
+    start = datetime(2025, 8, 22)
+    data = make_payload(days, seed, start)
+    out = {
+        "latitude": 51.5, "longitude": -0.120000124, "generationtime_ms": 0.0879,
+        "utc_offset_seconds": 3600, "timezone": "Europe/London",
+        "timezone_abbreviation": "BST", "elevation": 23.0,
+        "hourly_units": {"time": "iso8601", "relative_humidity_2m": "%",
+                         "temperature_2m": "°C", "weathercode": "wmo code"},
+        "hourly": data["hourly"],
+        "daily_units": {"time": "iso8601", "temperature_2m_max": "°C", "temperature_2m_min": "°C",
+                        "weathercode": "wmo code", "sunrise": "iso8601", "sunset": "iso8601",
+                        "rain_sum": "mm", "precipitation_probability_max": "%"},
+        "daily": data["daily"],
+    }
+    days_ = [start + timedelta(days=d) for d in range(days)]
+    out["daily"]["sunrise"] = [(d + timedelta(hours=5, minutes=50 + i)).strftime("%Y-%m-%dT%H:%M") for i, d in enumerate(days_)]
+    out["daily"]["sunset"] = [(d + timedelta(hours=20, minutes=10 - i)).strftime("%Y-%m-%dT%H:%M") for i, d in enumerate(days_)]
+    out["daily"]["rain_sum"] = [round(0.7 * i, 1) for i in range(days)]
+    return out
+
+
+def deep_size(obj, seen=None):
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, list):
+        size += sum(deep_size(v, seen) for v in obj)
+    return size
+
+
+def per_call(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def main(days, number):
+    payload = full_payload(days)
+    text = json.dumps(payload)
+    blob = encode(payload)
+
+    assert decode(blob) == payload
+    assert json.dumps(decode(blob)) == text
+    print(f"{days}-day payload: round trip is lossless")
+
+    print("\nsize (bytes)")
+    print(f"  JSON text          {len(text.encode()):8d}")
+    print(f"  JSON gzip          {len(gzip.compress(text.encode())):8d}")
+    print(f"  codec              {len(blob):8d}")
+    print(f"  dict in memory     {deep_size(payload):8d}")
+
+    print(f"\ntime (us/call, best of 5 x {number})")
+    print(f"  json.loads         {per_call(lambda: json.loads(text), number):8.1f}")
+    print(f"  decode -> dict     {per_call(lambda: decode(blob), number):8.1f}")
+    print(f"  open + 1 column    {per_call(lambda: EncodedForecast(blob).column('hourly', 'temperature_2m'), number):8.1f}")
+    print(f"  json.dumps         {per_call(lambda: json.dumps(payload), number):8.1f}")
+    print(f"  encode             {per_call(lambda: encode(payload), max(1, number // 10)):8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+    main(args.days, args.number)
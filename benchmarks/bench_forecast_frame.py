@@ -0,0 +1,114 @@
+# benchmarks/bench_forecast_frame.py
+# ForecastFrame vs the row-by-row transforms in services/weather_service.py.
+# First checks that both produce identical output (both units, current hour
+# inside / outside the forecast, irregular axis), then times a full page's
+# worth of transforms per payload.
+#
+#   python -m benchmarks.bench_forecast_frame [--days 7] [--number 2000]
+
+import argparse
+import random
+import timeit
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from services.forecast_frame import ForecastFrame
+from services.weather_service import (
+    organize_weekly_forecast,
+    hourly_forcast_list_f,
+    current_hour_description,
+)
+
+
+def make_payload(days=7, seed=1, start=datetime(2025, 8, 22)):
+    """Open-Meteo shaped forecast with realistic value types (1-decimal temps, int humidity)."""
+    rnd = random.Random(seed)
+    codes = [0, 1, 2, 3, 45, 51, 61, 63, 80, 95]
+    hours = [start + timedelta(hours=h) for h in range(days * 24)]
+    return {
+        "timezone": "Europe/London",
+        "hourly": {
+            "time": [h.strftime("%Y-%m-%dT%H:%M") for h in hours],
+            "temperature_2m": [round(rnd.uniform(-5, 30), 1) for _ in hours],
+            "relative_humidity_2m": [rnd.randint(20, 100) for _ in hours],
+            "weathercode": [rnd.choice(codes) for _ in hours],
+        },
+        "daily": {
+            "time": [(start + timedelta(days=d)).strftime("%Y-%m-%d") for d in range(days)],
+            "temperature_2m_max": [round(rnd.uniform(10, 30), 1) for _ in range(days)],
+            "temperature_2m_min": [rnd.choice([round(rnd.uniform(-5, 10), 1), rnd.randint(-5, 10)]) for _ in range(days)],
+            "precipitation_probability_max": [rnd.randint(0, 100) for _ in range(days)],
+            "weathercode": [rnd.choice(codes) for _ in range(days)],
+        },
+    }
+
+
+def legacy_humidity(data):
+    # The per-day humidity averaging the page used to show.
+    humidity = data["hourly"]["relative_humidity_2m"]
+    return [round(sum(humidity[d * 24:d * 24 + 24]) / 24, 2) for d in range(len(humidity) // 24)]
+
+
+def legacy_page(data, now_local, temp_type):
+    return (
+        current_hour_description(data, now_local),
+        legacy_humidity(data),
+        organize_weekly_forecast(data, temp_type),
+        hourly_forcast_list_f(data, now_local, temp_type),
+    )
+
+
+def frame_page(data, now_local, temp_type):
+    frame = ForecastFrame(data)
+    return (
+        frame.current_description(now_local),
+        frame.daily_humidity_means(),
+        frame.weekly(temp_type),
+        frame.hourly_window(now_local, temp_type),
+    )
+
+
+def check(days):
+    tz = ZoneInfo("Europe/London")
+    payloads = [make_payload(days, seed) for seed in range(20)]
+    gappy = make_payload(days, seed=99)
+    del gappy["hourly"]["time"][30]
+    for key in ("temperature_2m", "relative_humidity_2m", "weathercode"):
+        del gappy["hourly"][key][30]
+    payloads.append(gappy)
+
+    nows = [
+        datetime(2025, 8, 22, 0, 5, tzinfo=tz),
+        datetime(2025, 8, 23, 13, 59, tzinfo=tz),
+        datetime(2025, 8, 22, 6, 30, tzinfo=tz) + timedelta(hours=days * 24 - 8),
+        datetime(2025, 8, 21, 3, 0, tzinfo=tz),   # before the forecast starts
+        datetime(2025, 9, 30, 12, 0, tzinfo=tz),  # after it ends
+        datetime(2025, 8, 23, 6, 0, tzinfo=tz),   # the hour missing from the gappy payload
+    ]
+    checked = 0
+    for data in payloads:
+        for now in nows:
+            for unit in ("c", "f", "k"):
+                assert legacy_page(data, now, unit) == frame_page(data, now, unit), (now, unit)
+                assert repr(legacy_page(data, now, unit)) == repr(frame_page(data, now, unit))
+                checked += 1
+    print(f"identical output for {checked} payload/time/unit combinations")
+
+
+def bench(days, number):
+    data = make_payload(days)
+    now = datetime(2025, 8, 23, 14, 10, tzinfo=ZoneInfo("Europe/London"))
+    print(f"{days}-day payload, {number} page renders each")
+    for name, fn in (("row-by-row", legacy_page), ("ForecastFrame", frame_page)):
+        for unit in ("c", "f"):
+            best = min(timeit.repeat(lambda: fn(data, now, unit), number=number, repeat=5))
+            print(f"  {name:<14} {unit}  {best / number * 1e6:8.1f} us/page")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+    check(args.days)
+    bench(args.days, args.number)
@@ -0,0 +1,281 @@
+# benchmarks/bench_pipeline.py
+# Request pipeline benchmarks against recorded provider responses.
+#
+# Times the search and forecast transforms on their own and the whole
+# search -> results page path through Flask's test client. Provider HTTP is
+# replayed from benchmarks/fixtures/providers.json (benchmarks/recorded.py),
+# so runs are offline and repeatable. For each case: p50/p90/p99 per call,
+# plus tracemalloc peak and retained memory per call on a separate pass, and
+# the change against a saved baseline.
+#
+#   python -m benchmarks.bench_pipeline [--number 200] [--rounds 5] [--only page]
+#   python -m benchmarks.bench_pipeline --save-baseline    # on the base branch
+#   python -m benchmarks.bench_pipeline --baseline         # on the change; exits 1 on a regression
+#   python -m benchmarks.bench_pipeline --record           # re-record fixtures (network + real API_KEY)
+#
+# Baselines are only comparable on the same machine and Python.
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+# The app reads these at import time: an empty throwaway database,
+# memory-only caches, no background pre-warmer.
+os.environ.setdefault("API_KEY", "bench")
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='bench-')}/bench.db"
+os.environ["CACHE_PERSISTENT"] = "0"
+os.environ["PREWARM_ENABLED"] = "0"
+os.environ["PREWARM_IN_PROCESS"] = "0"
+
+from benchmarks.recorded import FIXTURES, Recorder, Replayer
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# The searches the cases run; --record fetches whatever these touch.
+PAGE_FORM = {"city": "London", "country": "GB", "temp_type": "c"}
+SEARCH_MANY = "Springfield"   # several candidates -> choose_location page
+SEARCH_TYPO = "Londn"         # no exact hit -> broadened fuzzy search
+
+
+@dataclass
+class Case:
+    name: str
+    fn: Callable
+    setup: Optional[Callable] = None   # untimed, before every call
+    scale: float = 1.0                 # share of --number (page cases are slow)
+
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def time_case(case: Case, number: int, warmup: int, rounds: int) -> dict:
+    """
+    `rounds` rounds of `number` calls. p50 is the median of the per-round
+    medians, which holds up better against a busy machine than one long run;
+    p90/p99 come from all samples.
+    """
+    def call():
+        if case.setup:
+            case.setup()
+        start = clock()
+        case.fn()
+        return clock() - start
+
+    clock = time.perf_counter_ns
+    for _ in range(warmup):
+        call()
+    samples, medians = [], []
+    for _ in range(rounds):
+        batch = sorted(call() for _ in range(number))
+        medians.append(percentile(batch, 50))
+        samples.extend(batch)
+    samples.sort()
+    medians.sort()
+    return {
+        "n": len(samples),
+        "mean_us": sum(samples) / len(samples) / 1000,
+        "p50_us": percentile(medians, 50) / 1000,
+        "p90_us": percentile(samples, 90) / 1000,
+        "p99_us": percentile(samples, 99) / 1000,
+    }
+
+
+def measure_memory(case: Case, number: int) -> dict:
+    """Median tracemalloc peak (above the starting point) and retained bytes per call."""
+    peaks, retained = [], []
+    gc.collect()
+    tracemalloc.start()
+    try:
+        for _ in range(number):
+            if case.setup:
+                case.setup()
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            case.fn()
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+    finally:
+        tracemalloc.stop()
+    peaks.sort()
+    retained.sort()
+    return {"peak_kb": percentile(peaks, 50) / 1024, "retained_b": percentile(retained, 50)}
+
+
+def build_cases(replayer):
+    import newestclean as nc
+    from services.cache import weather_cache
+    from services.geocode_cache import geocode_cache
+    from services.render_cache import render_cache
+    from services.forecast_frame import ForecastFrame
+    from services.weather_service import (
+        fetch_forecast_data, organize_weekly_forecast, hourly_forcast_list_f, current_hour_description,
+    )
+
+    def cold_search():
+        geocode_cache.memory.clear()
+
+    def cold_page():
+        render_cache.pages.clear()
+        weather_cache.memory.clear()
+        geocode_cache.memory.clear()
+
+    client = nc.app.test_client()
+
+    def page():
+        resp = client.post("/get_weather", data=PAGE_FORM, follow_redirects=True)
+        if resp.status_code != 200:
+            raise RuntimeError(f"results page returned {resp.status_code}")
+
+    # Inputs for the transform cases come through the same replayed calls.
+    with replayer.installed():
+        lat, lon = nc.get_coordinates(PAGE_FORM["city"], PAGE_FORM["country"])
+        cands = nc.search_locations(SEARCH_MANY)
+        full = fetch_forecast_data(lat, lon, "full")
+        page_payload = fetch_forecast_data(lat, lon, "page")
+    if not full or not page_payload or lat is False:
+        raise SystemExit(f"fixtures don't cover the benchmark inputs: {replayer.missing}")
+
+    now_local = nc.get_local_time(lat, lon, full.get("timezone"))
+    with nc.app.test_request_context():
+        view = nc.weather_view(page_payload, lat, lon, "c")
+    temp = float(view["temperature"].rstrip("°CF"))
+    sunrise, sunset = nc.extract_time_only(view["sunrise"]), nc.extract_time_only(view["sunset"])
+
+    def frame_page():
+        frame = ForecastFrame(page_payload)
+        frame.current_description(now_local)
+        frame.hourly_window(now_local, "c")
+        frame.weekly("c")
+
+    return [
+        Case("search_locations.cached", lambda: nc.search_locations(SEARCH_MANY)),
+        Case("search_locations.cold", lambda: nc.search_locations(SEARCH_MANY), setup=cold_search),
+        Case("search_locations.fuzzy.cold", lambda: nc.search_locations(SEARCH_TYPO), setup=cold_search),
+        Case("pick_best_location", lambda: nc.pick_best_location(cands, SEARCH_MANY)),
+        Case("image_type_f", lambda: nc.image_type_f(temp, view["description"], "c", now_local, sunrise, sunset)),
+        Case("organize_weekly_forecast", lambda: organize_weekly_forecast(full, "c")),
+        Case("hourly_forcast_list_f", lambda: hourly_forcast_list_f(full, now_local, "c")),
+        Case("current_hour_description", lambda: current_hour_description(full, now_local)),
+        Case("ForecastFrame.page", frame_page),
+        Case("get_weather_page.warm", page, scale=0.2),
+        Case("get_weather_page.render", page, setup=render_cache.pages.clear, scale=0.2),
+        Case("get_weather_page.cold", page, setup=cold_page, scale=0.2),
+    ]
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> tuple:
+    """{case: note} and whether anything regressed."""
+    notes, regressed = {}, False
+    for name, r in results.items():
+        base = baseline.get("cases", {}).get(name)
+        if base is None:
+            notes[name] = "new"
+            continue
+        parts = []
+        change = r["p50_us"] / base["p50_us"] - 1 if base["p50_us"] else 0.0
+        # Sub-microsecond swings are timer noise, not regressions.
+        if abs(change) > tolerance and abs(r["p50_us"] - base["p50_us"]) > 1:
+            parts.append(f"{'slower' if change > 0 else 'faster'} {change:+.0%}")
+            regressed |= change > 0
+        if "peak_kb" in r and "peak_kb" in base and base["peak_kb"]:
+            mem = r["peak_kb"] / base["peak_kb"] - 1
+            if abs(mem) > tolerance and abs(r["peak_kb"] - base["peak_kb"]) > 1:
+                parts.append(f"peak {mem:+.0%}")
+                regressed |= mem > 0
+        notes[name] = ", ".join(parts) or "~"
+    return notes, regressed
+
+
+def report(results: dict, notes: dict):
+    print(f"{'case':32} {'n':>6} {'p50 us':>10} {'p90 us':>10} {'p99 us':>10} {'peak KB':>9} {'retained B':>11}  baseline")
+    for name, r in results.items():
+        print(f"{name:32} {r['n']:>6} {r['p50_us']:>10.1f} {r['p90_us']:>10.1f} {r['p99_us']:>10.1f} "
+              f"{r.get('peak_kb', float('nan')):>9.1f} {r.get('retained_b', 0):>11}  {notes.get(name, '')}")
+
+
+def record():
+    """Run every case once against the live APIs and save what they fetched."""
+    if os.environ["API_KEY"] == "bench":
+        raise SystemExit("set API_KEY to a real OpenWeatherMap key to record fixtures")
+    recorder = Recorder()
+    with recorder.installed():
+        # Cold cases only: everything they touch has to reach the network.
+        import newestclean as nc
+        from services.weather_service import fetch_forecast_data
+        lat, lon = nc.get_coordinates(PAGE_FORM["city"], PAGE_FORM["country"])
+        nc.search_locations(SEARCH_MANY)
+        nc.search_locations(SEARCH_TYPO)
+        for profile in ("full", "page"):
+            fetch_forecast_data(lat, lon, profile)
+        nc.app.test_client().post("/get_weather", data=PAGE_FORM, follow_redirects=True)
+    recorder.save()
+    print(f"recorded {len(recorder.responses)} responses -> {FIXTURES}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Request pipeline benchmarks (offline, recorded responses).")
+    parser.add_argument("--number", type=int, default=200, help="timed calls per round for transform cases")
+    parser.add_argument("--rounds", type=int, default=5, help="timed rounds per case")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--memory-number", type=int, default=30, help="calls per case under tracemalloc")
+    parser.add_argument("--only", default="", help="run cases whose name contains this")
+    parser.add_argument("--baseline", nargs="?", const=BASELINE, help="compare against this baseline file")
+    parser.add_argument("--save-baseline", nargs="?", const=BASELINE, help="write results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed p50 / peak change before flagging")
+    parser.add_argument("--json", help="also write the results here")
+    parser.add_argument("--record", action="store_true", help="re-record provider fixtures from the live APIs")
+    args = parser.parse_args(argv)
+
+    if args.record:
+        record()
+        return 0
+
+    replayer = Replayer()
+    cases = [c for c in build_cases(replayer) if args.only in c.name]
+    results = {}
+    with replayer.installed():
+        for case in cases:
+            number = max(10, int(args.number * case.scale))
+            results[case.name] = time_case(case, number, args.warmup, args.rounds)
+            results[case.name].update(measure_memory(case, args.memory_number))
+    if replayer.missing:
+        raise SystemExit(f"calls missing from {FIXTURES} (re-record with --record): {sorted(set(replayer.missing))}")
+
+    notes, regressed = {}, False
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            notes, regressed = compare(results, json.load(fh), args.tolerance)
+    report(results, notes)
+
+    run = {
+        "meta": {
+            "when": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "fixtures": replayer.meta.get("recorded_at"),
+        },
+        "cases": results,
+    }
+    for path in filter(None, (args.save_baseline, args.json)):
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(run, fh, indent=1)
+        print(f"wrote {path}")
+    if regressed:
+        print(f"regressions beyond {args.tolerance:.0%} against {args.baseline}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+# benchmarks/load_driver.py
+# Traffic driver for load tests against a running app (e.g. gunicorn in
+# front of benchmarks/stub_providers.py, see that file for the env vars).
+#
+# Workers pick cities from a Zipf-distributed mix (a few popular cities,
+# a long tail), so the caches see something like real traffic, and each one
+# sends the search form (POST /get_weather, following the redirect to
+# /weather) or, with --api, GET /api/v1/weather. Reports throughput,
+# latency percentiles and outcomes:
+# - ok: a results page / 200 JSON
+# - stale: served from the last good payload (Cache-Control: no-cache)
+# - failed: an error page, a 4xx/5xx, or no response
+#
+#   python -m benchmarks.load_driver http://127.0.0.1:8000 --duration 60 --concurrency 16 --zipf 1.1
+#   python -m benchmarks.load_driver http://127.0.0.1:8000 --rps 50 --stub http://127.0.0.1:8081
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+import requests
+
+# Most popular first: rank 1 gets the most traffic.
+CITIES = [
+    ("London", "GB"), ("New York", "US"), ("Tokyo", "JP"), ("Paris", "FR"), ("Los Angeles", "US"),
+    ("Toronto", "CA"), ("Sydney", "AU"), ("Berlin", "DE"), ("Chicago", "US"), ("Mumbai", "IN"),
+    ("Madrid", "ES"), ("Singapore", "SG"), ("Dubai", "AE"), ("Rome", "IT"), ("Seoul", "KR"),
+    ("Mexico City", "MX"), ("Amsterdam", "NL"), ("Houston", "US"), ("Sao Paulo", "BR"), ("Istanbul", "TR"),
+    ("Cairo", "EG"), ("Lagos", "NG"), ("Bangkok", "TH"), ("Vienna", "AT"), ("Dublin", "IE"),
+    ("Stockholm", "SE"), ("Lisbon", "PT"), ("Warsaw", "PL"), ("Athens", "GR"), ("Nairobi", "KE"),
+    ("Buenos Aires", "AR"), ("Lima", "PE"), ("Jakarta", "ID"), ("Manila", "PH"), ("Hanoi", "VN"),
+    ("Oslo", "NO"), ("Helsinki", "FI"), ("Prague", "CZ"), ("Budapest", "HU"), ("Zurich", "CH"),
+    ("Seattle", "US"), ("Denver", "US"), ("Boston", "US"), ("Miami", "US"), ("Phoenix", "US"),
+    ("Vancouver", "CA"), ("Montreal", "CA"), ("Auckland", "NZ"), ("Cape Town", "ZA"), ("Reykjavik", "IS"),
+    ("Edinburgh", "GB"), ("Manchester", "GB"), ("Lyon", "FR"), ("Munich", "DE"), ("Milan", "IT"),
+    ("Osaka", "JP"), ("Kyoto", "JP"), ("Busan", "KR"), ("Perth", "AU"), ("Santiago", "CL"),
+]
+
+
+def zipf_weights(n: int, s: float) -> list:
+    return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] if ordered else float("nan")
+
+
+class Results:
+    def __init__(self):
+        self.latencies = []
+        self.outcomes = Counter()
+        self.statuses = Counter()
+        self.cities = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, seconds, outcome, status, city):
+        with self._lock:
+            self.latencies.append(seconds)
+            self.outcomes[outcome] += 1
+            self.statuses[status] += 1
+            self.cities[city] += 1
+
+
+def classify(resp, api: bool) -> str:
+    if resp.status_code >= 400:
+        return "failed"
+    if api:
+        ok = resp.status_code == 200
+    else:
+        # Error pages are 200s too; only /weather pages carry an ETag.
+        ok = urlsplit(resp.url).path == "/weather" and "ETag" in resp.headers
+    if not ok:
+        return "failed"
+    return "stale" if "no-cache" in resp.headers.get("Cache-Control", "") else "ok"
+
+
+def one_request(session, base: str, city: str, country: str, api: bool, timeout: float):
+    if api:
+        return session.get(f"{base}/api/v1/weather", params={"city": city, "country": country}, timeout=timeout)
+    return session.post(f"{base}/get_weather", data={"city": city, "country": country, "temp_type": "c"},
+                        timeout=timeout)
+
+
+def worker(args, results: Results, warm_until: float, stop_at: float, seed: int):
+    rnd = random.Random(seed)
+    cities = CITIES[:args.cities]
+    weights = zipf_weights(len(cities), args.zipf)
+    session = requests.Session()
+    interval = args.concurrency / args.rps if args.rps else 0.0
+    next_at = time.monotonic() + rnd.uniform(0, interval)
+    while True:
+        now = time.monotonic()
+        if now >= stop_at:
+            return
+        if interval:
+            if now < next_at:
+                time.sleep(next_at - now)
+            next_at += interval
+        city, country = rnd.choices(cities, weights)[0]
+        started = time.monotonic()
+        try:
+            resp = one_request(session, args.url, city, country, args.api, args.timeout)
+            outcome, status = classify(resp, args.api), resp.status_code
+        except requests.RequestException as e:
+            outcome, status = "failed", type(e).__name__
+        if started >= warm_until:
+            results.add(time.monotonic() - started, outcome, status, city)
+
+
+def summarize(results: Results, seconds: float) -> dict:
+    lat = sorted(results.latencies)
+    total = len(lat)
+    ms = lambda v: round(v * 1000, 1)
+    return {
+        "requests": total,
+        "seconds": round(seconds, 1),
+        "throughput_rps": round(total / seconds, 1) if seconds else 0.0,
+        "latency_ms": {"p50": ms(percentile(lat, 50)), "p90": ms(percentile(lat, 90)),
+                       "p99": ms(percentile(lat, 99)), "max": ms(lat[-1]) if lat else None},
+        "outcomes": {k: results.outcomes[k] for k in ("ok", "stale", "failed")},
+        "error_rate": round(results.outcomes["failed"] / total, 4) if total else 0.0,
+        "statuses": {str(k): v for k, v in results.statuses.most_common()},
+        "distinct_cities": len(results.cities),
+        "top_cities": results.cities.most_common(5),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Zipf city-mix traffic against a running weather app.")
+    parser.add_argument("url", help="app base URL, e.g. http://127.0.0.1:8000")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of measured traffic")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds of unmeasured traffic first")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rps", type=float, help="target total requests/second (default: as fast as possible)")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent; higher = more skewed to top cities")
+    parser.add_argument("--cities", type=int, default=len(CITIES), help=f"use the top N cities (max {len(CITIES)})")
+    parser.add_argument("--api", action="store_true", help="GET /api/v1/weather instead of the search form")
+    parser.add_argument("--timeout", type=float, default=15)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--stub", help="stub_providers URL; its /_stats is included in the report")
+    parser.add_argument("--json", help="also write the report here")
+    args = parser.parse_args(argv)
+    args.url = args.url.rstrip("/")
+    args.cities = max(1, min(args.cities, len(CITIES)))
+
+    results = Results()
+    start = time.monotonic()
+    warm_until = start + args.warmup
+    stop_at = warm_until + args.duration
+    threads = [
+        threading.Thread(target=worker, args=(args, results, warm_until, stop_at, args.seed + i), daemon=True)
+        for i in range(args.concurrency)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    report = summarize(results, time.monotonic() - warm_until)
+    report["config"] = {k: getattr(args, k) for k in ("concurrency", "rps", "zipf", "cities", "api", "duration")}
+    if args.stub:
+        try:
+            report["stub"] = requests.get(f"{args.stub.rstrip('/')}/_stats", timeout=5).json()
+        except (requests.RequestException, ValueError) as e:
+            report["stub"] = f"unavailable: {e}"
+    print(json.dumps(report, indent=1))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=1)
+
+
+if __name__ == "__main__":
+    main()
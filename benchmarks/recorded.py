@@ -0,0 +1,178 @@
+# benchmarks/recorded.py
+# Recorded provider responses for offline benchmarks.
+#
+# Every Open-Meteo / OpenWeatherMap call goes through requests.get or
+# requests.Session.get. Recorder wraps those and saves each JSON response to
+# benchmarks/fixtures/providers.json, keyed by host + path + sorted query
+# (the API key is left out). Replayer patches them to answer from that file
+# instead, so benchmarks never touch the network.
+#
+# Forecast timestamps are shifted on replay so the payload starts at the
+# current day / hour, as a live response would: the results page looks up
+# the current local hour in it.
+
+import json
+import os
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from urllib.parse import parse_qsl, urlencode, urlsplit
+from zoneinfo import ZoneInfo
+
+import requests
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "providers.json")
+SECRET_PARAMS = {"appid"}
+
+
+def response_key(url, params=None) -> str:
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True) + list((params or {}).items())
+    query = sorted((k, str(v)) for k, v in query if k not in SECRET_PARAMS)
+    return f"{parts.netloc}{parts.path}?{urlencode(query)}"
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, content: bytes, url: str = ""):
+        self.status_code = status_code
+        self.content = content
+        self.url = url
+        self.headers = {"Content-Type": "application/json"}
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} for {self.url}", response=self)
+
+
+@contextmanager
+def patched_get(get):
+    """Route requests.get and requests.Session.get through get(url, params=None, **kw)."""
+    saved = requests.get, requests.Session.get
+    requests.get = get
+    requests.Session.get = lambda _session, url, **kw: get(url, **kw)
+    try:
+        yield
+    finally:
+        requests.get, requests.Session.get = saved
+
+
+# ---- replay ----
+
+def _shift(value: str, delta: timedelta) -> str:
+    if len(value) == 10:
+        return (date.fromisoformat(value) + delta).isoformat()
+    return (datetime.fromisoformat(value) + delta).strftime("%Y-%m-%dT%H:%M")
+
+
+def rebase_forecast(payload: dict, now_utc: datetime) -> dict:
+    """
+    Shift an Open-Meteo payload recorded in the past so it starts today.
+    A whole-days hourly axis moves by whole days; a forecast_hours axis
+    (starting at the hour it was recorded) moves to start at the current hour.
+    """
+    try:
+        tz = ZoneInfo(payload.get("timezone") or "UTC")
+    except (KeyError, ValueError):
+        tz = timezone.utc
+    now_local = now_utc.astimezone(tz).replace(tzinfo=None, minute=0, second=0, microsecond=0)
+
+    daily = payload.get("daily") or {}
+    hourly = payload.get("hourly") or {}
+    day_delta = timedelta(0)
+    if daily.get("time"):
+        day_delta = timedelta(days=(now_local.date() - date.fromisoformat(daily["time"][0])).days)
+
+    hour_delta = day_delta
+    times = hourly.get("time") or []
+    if times:
+        first = datetime.fromisoformat(times[0])
+        whole_days = first.hour == 0 and len(times) % 24 == 0
+        if whole_days:
+            hour_delta = timedelta(days=(now_local.date() - first.date()).days)
+        else:
+            hour_delta = now_local - first
+
+    out = dict(payload)
+    if times:
+        out["hourly"] = dict(hourly, time=[_shift(t, hour_delta) for t in times])
+    if daily:
+        out["daily"] = dict(daily, **{
+            k: [_shift(v, day_delta) if isinstance(v, str) else v for v in daily[k]]
+            for k in ("time", "sunrise", "sunset") if k in daily
+        })
+    return out
+
+
+def _rebase(body, now_utc):
+    if isinstance(body, list):
+        return [_rebase(b, now_utc) for b in body]
+    if isinstance(body, dict) and ("hourly" in body or "daily" in body):
+        return rebase_forecast(body, now_utc)
+    return body
+
+
+def load_fixtures(path: str = FIXTURES) -> dict:
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+class Replayer:
+    """Answers provider calls from a fixtures file. Unknown calls get a 404 and are listed in .missing."""
+
+    def __init__(self, path: str = FIXTURES, now_utc: datetime = None):
+        now_utc = now_utc or datetime.now(timezone.utc)
+        fixtures = load_fixtures(path)
+        self.meta = fixtures.get("_meta", {})
+        # Serialized once, parsed on every call like a real response body.
+        self.responses = {
+            key: (entry["status"], json.dumps(_rebase(entry["body"], now_utc)).encode())
+            for key, entry in fixtures["responses"].items()
+        }
+        self.calls = 0
+        self.missing = []
+
+    def get(self, url, params=None, **_kw):
+        self.calls += 1
+        key = response_key(url, params)
+        entry = self.responses.get(key)
+        if entry is None:
+            self.missing.append(key)
+            return FakeResponse(404, b'{"error": "not recorded"}', url)
+        return FakeResponse(entry[0], entry[1], url)
+
+    def installed(self):
+        return patched_get(self.get)
+
+
+# ---- record ----
+
+class Recorder:
+    """Passes calls through to the network and keeps every JSON response."""
+
+    def __init__(self):
+        self.responses = {}
+        self._get = requests.get
+
+    def get(self, url, params=None, **kw):
+        resp = self._get(url, params=params, **kw)
+        try:
+            body = resp.json()
+        except ValueError:
+            return resp
+        self.responses[response_key(url, params)] = {"status": resp.status_code, "body": body}
+        return resp
+
+    def installed(self):
+        return patched_get(self.get)
+
+    def save(self, path: str = FIXTURES, note: str = "recorded from the live APIs"):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fixtures = {
+            "_meta": {"recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"), "note": note},
+            "responses": dict(sorted(self.responses.items())),
+        }
+        with open(path + ".tmp", "w", encoding="utf-8") as fh:
+            json.dump(fixtures, fh, indent=1)
+        os.replace(path + ".tmp", path)
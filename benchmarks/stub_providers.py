@@ -0,0 +1,250 @@
+# benchmarks/stub_providers.py
+# Local stand-in for Open-Meteo and OpenWeatherMap, for load tests.
+#
+# Replays benchmarks/fixtures/providers.json (see benchmarks/recorded.py):
+# - a recorded call is answered as recorded, timestamps moved to today
+# - a forecast for coordinates that weren't recorded gets the recorded
+#   payload for the same query (fields, days, hours), or the largest one,
+#   with the coordinates swapped in, so any city mix works; several
+#   coordinates get a list
+# - a geocoding query that wasn't recorded gets one made-up place whose
+#   coordinates are derived from the name (the same on every run)
+# Each answer is delayed by a draw from --latency. --error-rate and
+# --throttle-rate turn that share of answers into 500s / 429s, and
+# --max-rps answers 429 (with Retry-After) above that many requests/second.
+# GET /_stats returns the counts so far.
+#
+#   python -m benchmarks.stub_providers --port 8081 --latency lognormal:80,0.5 --error-rate 0.01
+#
+# then point the app at it:
+#   OPEN_METEO_FORECAST_URL=http://127.0.0.1:8081/v1/forecast \
+#   OPENWEATHER_BASE_URL=http://127.0.0.1:8081 gunicorn -w 4 newestclean:app
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import signal
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from benchmarks.recorded import FIXTURES, load_fixtures, rebase_forecast, response_key
+
+FORECAST_PATH = "/v1/forecast"
+GEOCODE_PATH = "/geo/1.0/direct"
+
+
+def parse_latency(spec: str):
+    """
+    'none', 'fixed:MS', 'uniform:LO,HI' or 'lognormal:MEDIAN,SIGMA' (all in
+    ms) -> a function returning one delay in seconds.
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",")] if args else []
+    if kind == "none":
+        return lambda: 0.0
+    if kind == "fixed" and len(values) == 1:
+        return lambda: values[0] / 1000
+    if kind == "uniform" and len(values) == 2:
+        return lambda: random.uniform(*values) / 1000
+    if kind == "lognormal" and len(values) == 2:
+        mu, sigma = math.log(values[0]), values[1]
+        return lambda: random.lognormvariate(mu, sigma) / 1000
+    raise argparse.ArgumentTypeError(f"bad latency spec {spec!r}")
+
+
+class TokenBucket:
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+def _local_key(url: str, params=None) -> str:
+    """response_key without the host: recorded keys carry the live one."""
+    key = response_key(url, params)
+    return key[key.index("/"):]
+
+
+def _shape(key: str) -> str:
+    """A forecast key without its coordinates."""
+    path, _, query = key.partition("?")
+    return path + "?" + "&".join(p for p in query.split("&") if not p.startswith(("latitude=", "longitude=")))
+
+
+def _made_up_place(q: str) -> dict:
+    name, _, country = q.partition(",")
+    digest = hashlib.sha256(q.lower().encode()).digest()
+    lat = int.from_bytes(digest[:4], "big") / 2**32 * 120 - 60
+    lon = int.from_bytes(digest[4:8], "big") / 2**32 * 360 - 180
+    return {"name": name.strip().title(), "lat": round(lat, 4), "lon": round(lon, 4),
+            "country": (country.strip() or "ZZ").upper(), "state": ""}
+
+
+class StubProviders:
+    def __init__(self, fixtures: dict, latency, error_rate=0.0, throttle_rate=0.0, max_rps=None):
+        self.recorded = fixtures["responses"]
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.bucket = TokenBucket(max_rps) if max_rps else None
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self._hour = None
+        self._rebase()
+
+    def _rebase(self):
+        # Recorded timestamps move with the clock, once per hour.
+        now = datetime.now(timezone.utc)
+        hour = now.replace(minute=0, second=0, microsecond=0)
+        with self._lock:
+            if hour == self._hour:
+                return
+            self.forecasts, self.templates, self.other = {}, {}, {}
+            for key, entry in self.recorded.items():
+                local, body = key[key.index("/"):], entry["body"]
+                if local.startswith(FORECAST_PATH + "?") and entry["status"] == 200:
+                    bodies = body if isinstance(body, list) else [body]
+                    bodies = [rebase_forecast(b, now) for b in bodies]
+                    if len(bodies) == 1:
+                        self.forecasts[local] = bodies[0]
+                    self.templates.setdefault(_shape(local), bodies[0])
+                else:
+                    self.other[local] = (entry["status"], body)
+            self.largest = max(self.templates.values(), key=lambda b: len(json.dumps(b)), default=None)
+            self._hour = hour
+
+    def answer(self, path: str, query: str):
+        """(status, body, extra headers) for one request."""
+        self._rebase()
+        if self.bucket and not self.bucket.take():
+            return 429, {"cod": 429, "message": "rate limit (stub --max-rps)"}, {"Retry-After": "1"}
+        roll = random.random()
+        if roll < self.throttle_rate:
+            return 429, {"cod": 429, "message": "rate limit (stub --throttle-rate)"}, {"Retry-After": "1"}
+        if roll < self.throttle_rate + self.error_rate:
+            return 500, {"error": True, "reason": "stub --error-rate"}, {}
+
+        params = dict(parse_qsl(query, keep_blank_values=True))
+        if path == FORECAST_PATH:
+            return self._forecast(params)
+        recorded = self.other.get(_local_key(f"http://stub{path}", params))
+        if recorded:
+            return recorded[0], recorded[1], {}
+        if path == GEOCODE_PATH:
+            return 200, [_made_up_place(params.get("q", ""))], {}
+        return 404, {"error": True, "reason": f"stub has no {path}"}, {}
+
+    def _forecast(self, params: dict):
+        lats = params.get("latitude", "").split(",")
+        lons = params.get("longitude", "").split(",")
+        template = self.templates.get(_shape(_local_key(f"http://stub{FORECAST_PATH}", params)))
+        if template is None:
+            # A profile that wasn't recorded: the largest recorded payload is
+            # a superset of what it asks for, and extra fields are ignored.
+            template = self.largest
+        if template is None or len(lats) != len(lons):
+            return 400, {"error": True, "reason": "no recorded forecast"}, {}
+        bodies = []
+        for lat, lon in zip(lats, lons):
+            single = _local_key(f"http://stub{FORECAST_PATH}", dict(params, latitude=lat, longitude=lon))
+            body = self.forecasts.get(single)
+            if body is None:
+                body = dict(template, latitude=float(lat), longitude=float(lon))
+            bodies.append(body)
+        return 200, (bodies if len(bodies) > 1 else bodies[0]), {}
+
+    def record(self, path: str, status: int):
+        with self._lock:
+            self.counts[f"{path} {status}"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(sorted(self.counts.items()))
+
+
+def make_handler(stub: StubProviders, verbose: bool):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            if parts.path == "/_stats":
+                status, body, headers = 200, stub.stats(), {}
+            else:
+                delay = stub.latency()
+                status, body, headers = stub.answer(parts.path, parts.query)
+                if delay > 0:
+                    time.sleep(delay)
+                stub.record(parts.path, status)
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, fmt, *args):
+            if verbose:
+                super().log_message(fmt, *args)
+
+    return Handler
+
+
+def _interrupt(_signum, _frame):
+    raise KeyboardInterrupt
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded Open-Meteo / OpenWeatherMap responses locally.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--fixtures", default=FIXTURES)
+    parser.add_argument("--latency", type=parse_latency, default="lognormal:60,0.6",
+                        help="none | fixed:MS | uniform:LO,HI | lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of answers that are 500s")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of answers that are 429s")
+    parser.add_argument("--max-rps", type=float, help="answer 429 above this many requests/second")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    stub = StubProviders(load_fixtures(args.fixtures), args.latency, args.error_rate, args.throttle_rate, args.max_rps)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(stub, args.verbose))
+    server.daemon_threads = True
+    print(f"stub providers on http://{args.host}:{args.port} ({len(stub.recorded)} recorded responses)")
+    print(f"  OPEN_METEO_FORECAST_URL=http://{args.host}:{args.port}{FORECAST_PATH}")
+    print(f"  OPENWEATHER_BASE_URL=http://{args.host}:{args.port}")
+    # Print the stats on kill as well as on Ctrl-C.
+    signal.signal(signal.SIGTERM, _interrupt)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(stub.stats(), indent=1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+# build_assets.py
+# Build step for the static assets (runtime side: services/assets.py).
+#
+#   python build_assets.py [--clean]
+#
+# - static/img: each image resized to ASSET_IMAGE_WIDTHS (never upscaled) and
+#   saved as AVIF, WebP and progressive JPEG. Needs Pillow; AVIF needs
+#   Pillow >= 11.3 or pillow-avif-plugin. Without Pillow images are only
+#   copied under fingerprinted names.
+# - static/*.css, static/js/*.js: copied under fingerprinted names, with a .gz
+#   (and, if the brotli package is installed, .br) next to each. url(/static/...)
+#   references inside CSS are rewritten to the fingerprinted files.
+# - manifest.json in ASSET_DIST_DIR maps source paths to built ones.
+#
+# Built names carry a hash of their bytes, so they can be cached forever.
+# Older builds are left in place for pages still cached with their URLs;
+# --clean deletes whatever the new manifest doesn't reference.
+
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+
+import config
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC = os.path.join(ROOT, "static")
+DIST = os.path.join(ROOT, config.ASSET_DIST_DIR)
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+CSS_URL = re.compile(r"""url\(\s*(['"]?)/static/([^'")]+)\1\s*\)""")
+CSS_RULE = re.compile(r"([^{}]+)\{([^{}]*)\}")
+CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+BACKGROUND_SELECTOR = re.compile(r"^body\.[\w-]+(::before|::after)?$")
+
+
+def fingerprint(rel_path: str, data: bytes, suffix: str = "") -> str:
+    """'img/sunrise and sunset case.jpg' -> 'img/sunrise-and-sunset-case<suffix>.<hash>.jpg'"""
+    folder, name = os.path.split(rel_path)
+    stem, ext = os.path.splitext(name)
+    stem = re.sub(r"\s+", "-", stem.strip())
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    return os.path.join(folder, f"{stem}{suffix}.{digest}{ext.lower()}").replace(os.sep, "/")
+
+
+def write(built: str, data: bytes):
+    path = os.path.join(DIST, built)
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as fh:
+        fh.write(data)
+    os.replace(path + ".tmp", path)
+
+
+def sources(folder: str, exts) -> list:
+    base = os.path.join(STATIC, folder)
+    if not os.path.isdir(base):
+        return []
+    return sorted(
+        os.path.join(folder, name).replace(os.sep, "/").lstrip("/")
+        for name in os.listdir(base)
+        if name.lower().endswith(exts) and os.path.isfile(os.path.join(base, name))
+    )
+
+
+def read(rel_path: str) -> bytes:
+    with open(os.path.join(STATIC, rel_path), "rb") as fh:
+        return fh.read()
+
+
+# ---- images ----
+
+def image_formats():
+    """(PIL format, mime, extension, save options), best first."""
+    Image.init()
+    try:
+        import pillow_avif  # noqa: F401  (registers AVIF on Pillow < 11.3)
+    except ImportError:
+        pass
+    quality = config.ASSET_IMAGE_QUALITY
+    formats = []
+    if "AVIF" in Image.SAVE:
+        # AVIF holds up at a much lower quality setting than JPEG/WebP.
+        formats.append(("AVIF", "image/avif", ".avif", {"quality": max(1, quality - 30)}))
+    else:
+        print("AVIF encoder not available; building WebP and JPEG only.")
+    formats.append(("WEBP", "image/webp", ".webp", {"quality": quality, "method": 6}))
+    formats.append(("JPEG", "image/jpeg", ".jpg", {"quality": quality, "optimize": True, "progressive": True}))
+    return formats
+
+
+def target_widths(width: int) -> list:
+    largest = min(width, max(config.ASSET_IMAGE_WIDTHS))
+    return sorted({w for w in config.ASSET_IMAGE_WIDTHS if w < largest} | {largest})
+
+
+def build_image(rel_path: str, formats) -> list:
+    with Image.open(os.path.join(STATIC, rel_path)) as src:
+        img = ImageOps.exif_transpose(src).convert("RGB")
+    variants = []
+    for width in target_widths(img.width):
+        frame = img if width == img.width else img.resize(
+            (width, round(img.height * width / img.width)), Image.LANCZOS)
+        for fmt, mime, ext, options in formats:
+            buf = io.BytesIO()
+            frame.save(buf, fmt, **options)
+            data = buf.getvalue()
+            built = fingerprint(os.path.splitext(rel_path)[0] + ext, data, suffix=f"-{width}")
+            write(built, data)
+            variants.append({"path": built, "width": width, "type": mime, "bytes": len(data)})
+    return variants
+
+
+# ---- css / js ----
+
+def compress(built: str, data: bytes) -> bool:
+    """Write .gz (and .br) siblings when they are smaller. True if any was written."""
+    wrote = False
+    packed = [(".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        packed.append((".br", brotli.compress(data, quality=11)))
+    for suffix, blob in packed:
+        if len(blob) < len(data):
+            write(built + suffix, blob)
+            wrote = True
+    return wrote
+
+
+def rewrite_css(text: str, files: dict) -> str:
+    def swap(m):
+        built = files.get(m.group(2))
+        if built is None:
+            return m.group(0)
+        return f'url("/assets/{built}")'
+    return CSS_URL.sub(swap, text)
+
+
+def backgrounds(text: str) -> dict:
+    """{'body.clearcase': 'img/clearcase.jpg', ...} from background-image rules."""
+    found = {}
+    for selectors, body in CSS_RULE.findall(CSS_COMMENT.sub("", text)):
+        if "background-image" not in body:
+            continue
+        m = CSS_URL.search(body)
+        if not m:
+            continue
+        for selector in selectors.split(","):
+            selector = " ".join(selector.split())
+            if BACKGROUND_SELECTOR.match(selector):
+                found.setdefault(selector, m.group(2))
+    return found
+
+
+def build() -> dict:
+    manifest = {"version": 1, "files": {}, "images": {}, "backgrounds": {}, "compressed": []}
+    files = manifest["files"]
+
+    formats = image_formats() if Image is not None else None
+    if formats is None:
+        print("Pillow not installed; images are fingerprinted but not resized or converted.")
+    for rel in sources("img", IMAGE_EXTS):
+        if formats:
+            variants = build_image(rel, formats)
+            manifest["images"][rel] = variants
+            # Plain url() fallback: the widest JPEG.
+            files[rel] = max((v for v in variants if v["type"] == "image/jpeg"), key=lambda v: v["width"])["path"]
+        else:
+            data = read(rel)
+            files[rel] = fingerprint(rel, data)
+            write(files[rel], data)
+
+    for rel in sources("js", (".js",)):
+        data = read(rel)
+        files[rel] = fingerprint(rel, data)
+        write(files[rel], data)
+        if compress(files[rel], data):
+            manifest["compressed"].append(files[rel])
+
+    for rel in sources("", (".css",)):
+        text = read(rel).decode("utf-8")
+        manifest["backgrounds"].update(backgrounds(text))
+        data = rewrite_css(text, files).encode("utf-8")
+        files[rel] = fingerprint(rel, data)
+        write(files[rel], data)
+        if compress(files[rel], data):
+            manifest["compressed"].append(files[rel])
+
+    return manifest
+
+
+def clean(manifest: dict) -> int:
+    keep = set(manifest["files"].values())
+    keep.update(v["path"] for variants in manifest["images"].values() for v in variants)
+    keep.update(f"{p}{s}" for p in manifest["compressed"] for s in (".gz", ".br"))
+    keep.add("manifest.json")
+    removed = 0
+    for folder, _dirs, names in os.walk(DIST):
+        for name in names:
+            rel = os.path.relpath(os.path.join(folder, name), DIST).replace(os.sep, "/")
+            if rel not in keep:
+                os.remove(os.path.join(folder, name))
+                removed += 1
+    return removed
+
+
+def summary(manifest: dict):
+    for rel, variants in manifest["images"].items():
+        original = os.path.getsize(os.path.join(STATIC, rel))
+        smallest = min(v["bytes"] for v in variants)
+        print(f"{rel}: {original / 1024:.0f} KB -> {len(variants)} variants, smallest {smallest / 1024:.0f} KB")
+    print(f"{len(manifest['files'])} files, {len(manifest['compressed'])} precompressed, "
+          f"{len(manifest['backgrounds'])} background rules -> {DIST}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build fingerprinted static assets.")
+    parser.add_argument("--clean", action="store_true", help="delete built files the new manifest doesn't use")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(STATIC):
+        sys.exit(f"no static folder at {STATIC}")
+    os.makedirs(DIST, exist_ok=True)
+    manifest = build()
+
+    path = os.path.join(DIST, "manifest.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+    if args.clean:
+        print(f"removed {clean(manifest)} stale files")
+    summary(manifest)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,9 @@
 # Central place to store constants and shared settings
 # (API endpoints, weather code map, and other values used across the app).
 
-SUN_WINDOW_MINUTES = 20
+import os
 
-DAYS_OF_WEEK = ["MONDAY", "TUESDAY", "WEDNESDAY", "THURSDAY", "FRIDAY", "SATURDAY", "SUNDAY"]
+SUN_WINDOW_MINUTES = 20
 
 MONTH_NAME_MAP = {
     "01": "January", "02": "February", "03": "March", "04": "April",
@@ -14,6 +14,157 @@ MONTH_NAME_MAP = {
 
 LIMIT = 1
 
+# ---- Upstream weather cache ----
+# Coordinates are rounded to this many decimals before they become part of a
+# cache key (2 decimals is roughly 1 km, finer than the forecast grid).
+CACHE_COORD_DECIMALS = 2
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+# Set CACHE_PERSISTENT=0 to keep the cache in-process only.
+CACHE_PERSISTENT = os.getenv("CACHE_PERSISTENT", "1") != "0"
+FORECAST_CACHE_TTL = int(os.getenv("FORECAST_CACHE_TTL", "900"))
+# How long past its TTL a payload is kept to serve when upstream is down.
+CACHE_STALE_TTL = int(os.getenv("CACHE_STALE_TTL", str(6 * 3600)))
+# Store forecast payloads in weather_cache.payload_blob using the packed
+# format in services/forecast_codec.py instead of JSON.
+CACHE_BINARY_PAYLOADS = os.getenv("CACHE_BINARY_PAYLOADS", "1") != "0"
+# Also keep them packed in the memory tier: ~4 KB instead of ~30 KB of Python
+# objects per forecast, at the cost of a ~50us decode on every hit.
+CACHE_MEMORY_COMPACT = os.getenv("CACHE_MEMORY_COMPACT", "0") == "1"
+
+# ---- Rendered results pages (services/render_cache.py) ----
+RENDER_CACHE_MAX_ENTRIES = int(os.getenv("RENDER_CACHE_MAX_ENTRIES", "256"))
+# Upper bound on how long a rendered page (and its max-age) is reused.
+RENDER_CACHE_TTL = int(os.getenv("RENDER_CACHE_TTL", os.getenv("FORECAST_CACHE_TTL", "900")))
+
+# ---- Static assets (build_assets.py, services/assets.py) ----
+# Build output, relative to the app root; served at /assets/.
+ASSET_DIST_DIR = os.getenv("ASSET_DIST_DIR", os.path.join("static", "dist"))
+ASSET_IMAGE_WIDTHS = [int(w) for w in os.getenv("ASSET_IMAGE_WIDTHS", "640,1280,1920").split(",")]
+ASSET_IMAGE_QUALITY = int(os.getenv("ASSET_IMAGE_QUALITY", "80"))
+# Built files are named by content hash, so they are cached for a year.
+ASSET_MAX_AGE = int(os.getenv("ASSET_MAX_AGE", str(365 * 24 * 3600)))
+
+# ---- Geocoding cache (services/geocode_cache.py) ----
+# Place coordinates barely change, so positive answers live for a week.
+# "No results" answers expire sooner in case the provider adds the place.
+GEOCODE_CACHE_MAX_ENTRIES = int(os.getenv("GEOCODE_CACHE_MAX_ENTRIES", "2048"))
+GEOCODE_CACHE_TTL = int(os.getenv("GEOCODE_CACHE_TTL", str(7 * 24 * 3600)))
+GEOCODE_NEGATIVE_TTL = int(os.getenv("GEOCODE_NEGATIVE_TTL", "3600"))
+
+# ---- City search ----
+# Fuzzy matching thresholds shared by search_locations and the gazetteer:
+# give up if the best difflib ratio is below the threshold, and keep only
+# candidates within CLOSE_MARGIN of the best one.
+FUZZY_BEST_SIM_THRESHOLD = 0.55
+FUZZY_CLOSE_MARGIN = 0.15
+# Optional offline gazetteer (services/gazetteer.py): a GeoNames cities .txt
+# or an index built from one. Unset = live OWM geocoding only.
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", "")
+
+# ---- Forecast queries (services/forecast_query.py) ----
+# Both upstream base URLs can point at a local stand-in for load tests
+# (benchmarks/stub_providers.py).
+OPEN_METEO_FORECAST_URL = os.getenv("OPEN_METEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
+OPENWEATHER_BASE_URL = os.getenv("OPENWEATHER_BASE_URL", "https://api.openweathermap.org").rstrip("/")
+# Extra hourly rows fetched past what a view shows, so a cached payload still
+# covers the window at its oldest: served fresh for FORECAST_CACHE_TTL, then
+# stale for up to CACHE_STALE_TTL while upstream is down (ceil of both in
+# hours, plus the partial hour it was fetched in).
+FORECAST_HOURS_SLACK = int(os.getenv(
+    "FORECAST_HOURS_SLACK", str(-(-(FORECAST_CACHE_TTL + CACHE_STALE_TTL) // 3600) + 1)
+))
+
+# ---- Provider layer (services/providers.py) ----
+# Extra Open-Meteo compatible forecast endpoints to fall back to, in order
+# (comma-separated), e.g. a self-hosted instance.
+OPEN_METEO_FALLBACK_URLS = [u.strip() for u in os.getenv("OPEN_METEO_FALLBACK_URLS", "").split(",") if u.strip()]
+# Open a provider's circuit after this many failures in a row, and probe it
+# again after PROVIDER_RESET_SECONDS.
+PROVIDER_FAILURE_THRESHOLD = int(os.getenv("PROVIDER_FAILURE_THRESHOLD", "3"))
+PROVIDER_RESET_SECONDS = float(os.getenv("PROVIDER_RESET_SECONDS", "30"))
+# Time budget for one fetch across the whole fallback chain. A results page
+# waits at most this long before it falls back to a stale copy.
+PROVIDER_BUDGET = float(os.getenv("PROVIDER_BUDGET", "6"))
+
+# ---- Batch API (/api/v1/weather/batch) ----
+BATCH_MAX_LOCATIONS = int(os.getenv("BATCH_MAX_LOCATIONS", "50"))
+# Coordinates per multi-location Open-Meteo request (keeps URLs short).
+BATCH_UPSTREAM_CHUNK = int(os.getenv("BATCH_UPSTREAM_CHUNK", "20"))
+# Upstream calls / geocoding lookups in flight per batch (shares the fan-out pool).
+BATCH_MAX_PARALLEL = int(os.getenv("BATCH_MAX_PARALLEL", "4"))
+
+# ---- Instrumentation (services/metrics.py) ----
+# Per-stage timings in a Server-Timing response header.
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1") != "0"
+# If set, /metrics wants "Authorization: Bearer <token>".
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# ---- On-demand profiling (services/profiling.py) ----
+# Off (and free) unless PROFILE_ENABLED=1. Then PROFILE_ADMINS (comma-separated
+# account emails) can profile a request with ?_profile=sample|cprofile, and
+# PROFILE_SAMPLE_RATE of all requests are profiled in PROFILE_MODE.
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "0") == "1"
+PROFILE_ADMINS = {e.strip().lower() for e in os.getenv("PROFILE_ADMINS", "").split(",") if e.strip()}
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sample")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+# Relative to the app folder; the newest PROFILE_KEEP captures are kept.
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "100"))
+
+# ---- Upstream fan-out (services/fanout.py) ----
+# One pool is shared by every request in the worker process.
+FANOUT_MAX_WORKERS = int(os.getenv("FANOUT_MAX_WORKERS", "8"))
+# Whole-stage deadline and the Open-Meteo timeout, in seconds.
+FANOUT_DEADLINE = float(os.getenv("FANOUT_DEADLINE", "8"))
+OPEN_METEO_TIMEOUT = float(os.getenv("OPEN_METEO_TIMEOUT", "6"))
+# How long a caller waits on an identical in-flight fetch started by another
+# thread before giving up (services/singleflight.py).
+SINGLEFLIGHT_WAIT = float(os.getenv("SINGLEFLIGHT_WAIT", "10"))
+
+# ---- Retention (services/retention.py) ----
+# Rows older than a table's window are appended to gzipped JSON-lines files
+# (RETENTION_ARCHIVE_DIR/<table>/<YYYY-MM>.jsonl.gz) and deleted from the
+# table. 0 days keeps a table forever. Run: python -m services.retention run
+RETENTION_SEARCH_EVENT_DAYS = int(os.getenv("RETENTION_SEARCH_EVENT_DAYS", "365"))
+RETENTION_OBSERVATION_LOG_DAYS = int(os.getenv("RETENTION_OBSERVATION_LOG_DAYS", "90"))
+RETENTION_ARCHIVE_DIR = os.getenv("RETENTION_ARCHIVE_DIR", "archive")
+# Rows per delete transaction, and the pause between transactions so the
+# search recorder gets SQLite's write lock in between.
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+RETENTION_BATCH_PAUSE = float(os.getenv("RETENTION_BATCH_PAUSE", "0.05"))
+
+# ---- Cache pre-warmer (services/prewarm.py) ----
+PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "0") == "1"
+# Run as a daemon thread inside each web worker instead of its own process.
+PREWARM_IN_PROCESS = os.getenv("PREWARM_IN_PROCESS", "0") == "1"
+# Touch this file to pause the pre-warmer without restarting anything.
+PREWARM_PAUSE_FILE = os.getenv("PREWARM_PAUSE_FILE", "prewarm.pause")
+PREWARM_BUDGET_PER_MIN = float(os.getenv("PREWARM_BUDGET_PER_MIN", "30"))
+PREWARM_TOP_N = int(os.getenv("PREWARM_TOP_N", "50"))
+PREWARM_WINDOW_HOURS = float(os.getenv("PREWARM_WINDOW_HOURS", "24"))
+# Refresh an entry once it has less than this many seconds left.
+PREWARM_LEAD_SECONDS = float(os.getenv("PREWARM_LEAD_SECONDS", "120"))
+PREWARM_JITTER = float(os.getenv("PREWARM_JITTER", "30"))
+PREWARM_TICK_SECONDS = float(os.getenv("PREWARM_TICK_SECONDS", "30"))
+PREWARM_RERANK_SECONDS = float(os.getenv("PREWARM_RERANK_SECONDS", "300"))
+
+# ---- Search event write-behind (services/search_recorder.py) ----
+SEARCH_QUEUE_MAX = int(os.getenv("SEARCH_QUEUE_MAX", "10000"))
+SEARCH_FLUSH_SIZE = int(os.getenv("SEARCH_FLUSH_SIZE", "200"))
+SEARCH_FLUSH_INTERVAL = float(os.getenv("SEARCH_FLUSH_INTERVAL", "2"))
+
+# ---- Logged-in user cache (services/identity_cache.py) ----
+IDENTITY_CACHE_MAX_ENTRIES = int(os.getenv("IDENTITY_CACHE_MAX_ENTRIES", "1024"))
+IDENTITY_CACHE_TTL = int(os.getenv("IDENTITY_CACHE_TTL", "60"))
+
+# ---- Timezone lookup (services/timezone_service.py) ----
+# in_memory loads the whole TimezoneFinder dataset into RAM (faster lookups,
+# more memory per worker).
+TZ_FINDER_IN_MEMORY = os.getenv("TZ_FINDER_IN_MEMORY", "0") == "1"
+TZ_GRID_DECIMALS = 2
+TZ_CACHE_SIZE = int(os.getenv("TZ_CACHE_SIZE", "4096"))
+
 
 WEATHERCODE_MAP = {
     0: "Clear sky",
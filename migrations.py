@@ -0,0 +1,175 @@
+# migrations.py
+# Versioned schema migrations + the startup schema snapshot.
+#
+# migrate() runs once at startup:
+# 1. applies every migration in MIGRATIONS newer than the highest version in
+#    the schema_version table, in order, each in its own transaction
+# 2. reflects the database once and publishes an immutable SchemaSnapshot
+#
+# Routes read the snapshot (current_schema().has_column(...)) instead of
+# running an inspector query on every request.
+#
+# Workers that start together take turns: each migration runs in its own
+# transaction under an exclusive lock (BEGIN IMMEDIATE on SQLite, an advisory
+# lock on Postgres) and re-reads the applied version once it has the lock, so
+# a migration another worker just applied is skipped rather than re-run.
+#
+# Migrations only add things (tables, columns, indexes) and check before
+# acting, so they are safe on a fresh database (where the baseline create_all makes
+# the latest schema) and on an old one.
+# To add one: append (next_version, "description", fn) to MIGRATIONS.
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping
+
+from sqlalchemy import inspect, select, func, text, LargeBinary
+
+from models_core import (
+    Base, engine as default_engine, SchemaVersion,
+    SearchEvent, ObservationLog, SearchArchiveRollup,
+)
+
+log = logging.getLogger(__name__)
+
+
+# ---- Helpers used by migrations ----
+def _columns(conn, table):
+    return {c["name"].lower() for c in inspect(conn).get_columns(table)}
+
+
+def _add_column(conn, table, name, ddl):
+    """ALTER TABLE ... ADD COLUMN unless the column already exists."""
+    if name.lower() not in _columns(conn, table):
+        conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {name} {ddl}'))
+
+
+def _create_indexes(conn, model):
+    for index in model.__table__.indexes:
+        index.create(bind=conn, checkfirst=True)
+
+
+# ---- Migrations ----
+def _m1_baseline(conn):
+    Base.metadata.create_all(bind=conn)
+
+
+def _m2_search_event_country(conn):
+    # Early databases predate the optional country column.
+    _add_column(conn, "search_event", "country", "VARCHAR(80)")
+
+
+def _m3_search_event_indexes(conn):
+    _create_indexes(conn, SearchEvent)
+
+
+def _m4_user_updated_at(conn):
+    _add_column(conn, "user", "updated_at", "DATETIME")
+
+
+def _m5_observation_log_user(conn):
+    _add_column(conn, "observation_log", "user_id", 'INTEGER REFERENCES "user"(id) ON DELETE SET NULL')
+    _create_indexes(conn, ObservationLog)
+
+
+def _m6_weather_cache_blob(conn):
+    _add_column(conn, "weather_cache", "payload_blob", LargeBinary().compile(dialect=conn.dialect))
+
+
+def _m7_search_archive_rollup(conn):
+    SearchArchiveRollup.__table__.create(bind=conn, checkfirst=True)
+
+
+MIGRATIONS = [
+    (1, "baseline tables", _m1_baseline),
+    (2, "search_event.country", _m2_search_event_country),
+    (3, "search_event indexes (user_id+created_at, created_at, city)", _m3_search_event_indexes),
+    (4, "user.updated_at", _m4_user_updated_at),
+    (5, "observation_log.user_id + rendered_at index", _m5_observation_log_user),
+    (6, "weather_cache.payload_blob", _m6_weather_cache_blob),
+    (7, "search_archive_rollup table", _m7_search_archive_rollup),
+]
+
+
+# ---- Snapshot ----
+@dataclass(frozen=True)
+class SchemaSnapshot:
+    version: int
+    columns: Mapping[str, frozenset]     # table -> column names (lowercase)
+    indexes: Mapping[str, frozenset]     # table -> index names
+
+    def has_table(self, table: str) -> bool:
+        return table in self.columns
+
+    def has_column(self, table: str, column: str) -> bool:
+        return column.lower() in self.columns.get(table, ())
+
+    def has_index(self, table: str, index: str) -> bool:
+        return index in self.indexes.get(table, ())
+
+
+def _snapshot(conn, version: int) -> SchemaSnapshot:
+    insp = inspect(conn)
+    columns, indexes = {}, {}
+    for table in insp.get_table_names():
+        columns[table] = frozenset(c["name"].lower() for c in insp.get_columns(table))
+        indexes[table] = frozenset(i["name"] for i in insp.get_indexes(table) if i.get("name"))
+    return SchemaSnapshot(version, MappingProxyType(columns), MappingProxyType(indexes))
+
+
+_current = None
+
+
+def current_schema() -> SchemaSnapshot:
+    if _current is None:
+        raise RuntimeError("migrations.migrate() has not run yet")
+    return _current
+
+
+def _applied_version(conn) -> int:
+    return conn.execute(select(func.coalesce(func.max(SchemaVersion.version), 0))).scalar_one()
+
+
+# Any constant shared by every worker; scoped to the transaction.
+_PG_LOCK_KEY = 7_011_001
+
+
+def _lock_schema(conn):
+    """Hold the migration lock until this transaction ends."""
+    name = conn.dialect.name
+    if name == "sqlite":
+        # pysqlite opens transactions lazily; take the write lock up front.
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+    elif name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _PG_LOCK_KEY})
+
+
+def migrate(engine=None) -> SchemaSnapshot:
+    """Apply pending migrations and publish the schema snapshot."""
+    global _current
+    engine = engine or default_engine
+
+    with engine.begin() as conn:
+        _lock_schema(conn)
+        SchemaVersion.__table__.create(bind=conn, checkfirst=True)
+        applied = _applied_version(conn)
+
+    for version, description, fn in MIGRATIONS:
+        if version <= applied:
+            continue
+        with engine.begin() as conn:
+            _lock_schema(conn)
+            if _applied_version(conn) >= version:
+                # Another worker applied it while we waited for the lock.
+                log.info("schema: migration %d already applied elsewhere", version)
+                continue
+            fn(conn)
+            conn.execute(SchemaVersion.__table__.insert().values(version=version, description=description))
+        log.info("schema: applied migration %d (%s)", version, description)
+
+    with engine.connect() as conn:
+        _current = _snapshot(conn, _applied_version(conn))
+    return _current
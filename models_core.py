@@ -4,20 +4,29 @@
 # - User: accounts + auth
 # - SearchEvent: one row per city search
 # - ObservationLog: optional raw data logging for debugging/analytics for the future 
+# - WeatherCache: persistent tier of the upstream weather cache (services/cache.py)
+# - GeocodeCache: remembered OWM geocoding answers (services/geocode_cache.py)
+# - CitySearchRollup / DailySearchRollup: precomputed search counts for
+#   /analytics, kept current by services/rollups.py
+# - SearchArchiveRollup: per day and city counts of search_event rows that
+#   services/retention.py archived and deleted, so rollups can still be rebuilt
+# - SchemaVersion: which migrations (migrations.py) have been applied
 
 
 from __future__ import annotations
 import os
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
 
 from sqlalchemy import (
-    String, Integer, Float, Text, DateTime, ForeignKey, func
+    String, Integer, Float, Text, Date, DateTime, ForeignKey, JSON, LargeBinary, Index, func
 )
 from sqlalchemy.orm import (
-    DeclarativeBase, Mapped, mapped_column, relationship, sessionmaker
+    DeclarativeBase, Mapped, mapped_column, relationship, sessionmaker, scoped_session
 )
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import StaticPool
 from flask_login import UserMixin
 
 # Base 
@@ -26,15 +35,97 @@ class Base(DeclarativeBase):
 
 # ---- Engine / Session ----
 DB_URL = os.getenv("DATABASE_URL", "sqlite:///weather_app.db")
-engine = create_engine(DB_URL, future=True, echo=False)
+
+# Pool sizing (ignored for in-memory SQLite, which needs a single shared connection).
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# SQLite pragmas applied to every new connection: WAL lets readers run while
+# the write-behind recorder writes, busy_timeout waits for the lock instead of
+# failing with "database is locked".
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+
+def _engine_options(url) -> dict:
+    opts = dict(future=True, echo=False)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        opts.update(poolclass=StaticPool, connect_args={"check_same_thread": False})
+        return opts
+    opts.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=url.get_backend_name() != "sqlite",
+    )
+    return opts
+
+
+_url = make_url(DB_URL)
+engine = create_engine(_url, **_engine_options(_url))
+
+if _url.get_backend_name() == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        cur.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cur.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cur.close()
+
+# Pool counters, to spot connection starvation (see pool_stats()).
+_pool_counters = {"connects": 0, "checkouts": 0, "checkins": 0, "peak_checked_out": 0}
+
+@event.listens_for(engine, "connect")
+def _count_connect(_dbapi_conn, _record):
+    _pool_counters["connects"] += 1
+
+@event.listens_for(engine, "checkout")
+def _count_checkout(_dbapi_conn, _record, _proxy):
+    _pool_counters["checkouts"] += 1
+    out = _pool_counters["checkouts"] - _pool_counters["checkins"]
+    if out > _pool_counters["peak_checked_out"]:
+        _pool_counters["peak_checked_out"] = out
+
+@event.listens_for(engine, "checkin")
+def _count_checkin(_dbapi_conn, _record):
+    _pool_counters["checkins"] += 1
+
+
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
-def init_db() -> None:
-    Base.metadata.create_all(bind=engine)
+# One session per request (per thread); init_app() removes it on teardown so
+# its connection goes back to the pool.
+db_session = scoped_session(SessionLocal)
+
+def init_app(app) -> None:
+    @app.teardown_appcontext
+    def _remove_session(_exc=None):
+        db_session.remove()
 
 def get_session():
+    """Request-scoped session. Don't close it; the app teardown does."""
+    return db_session()
+
+def new_session():
+    """Standalone session for background threads and services. Close it when done."""
     return SessionLocal()
 
+def pool_stats() -> dict:
+    pool = engine.pool
+    stats = dict(_pool_counters, status=pool.status())
+    # QueuePool-only numbers; StaticPool (in-memory SQLite) has none.
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        fn = getattr(pool, name, None)
+        if callable(fn):
+            stats[name] = fn()
+    stats["max_overflow"] = getattr(pool, "_max_overflow", None)
+    return stats
+
 # ---- Models ----
 class User(UserMixin, Base):
     __tablename__ = "user"
@@ -42,6 +133,8 @@ class User(UserMixin, Base):
     email: Mapped[str] = mapped_column(String(255), unique=True, nullable=False)
     password_hash: Mapped[str] = mapped_column(String(255), nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), nullable=False)
+    # Bumped whenever the row changes (e.g. a password change).
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime, onupdate=func.now())
     # The relationship is set so that when a User is deleted through the ORM,
     # cascade="all, delete-orphan" also deletes their related SearchEvent rows.
     searches: Mapped[list["SearchEvent"]] = relationship(
@@ -63,11 +156,92 @@ class SearchEvent(Base):
     # Optional user so anonymous searches can still be tracked.
     user: Mapped[Optional["User"]] = relationship(back_populates="searches")
 
+    __table_args__ = (
+        # "Your recent searches": WHERE user_id = ? ORDER BY created_at DESC
+        Index("ix_search_event_user_created", "user_id", "created_at"),
+        Index("ix_search_event_created_at", "created_at"),
+        Index("ix_search_event_city", "city"),
+    )
+
 class ObservationLog(Base):
     __tablename__ = "observation_log"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[Optional[int]] = mapped_column(ForeignKey("user.id", ondelete="SET NULL"))
     city: Mapped[Optional[str]] = mapped_column(String(120))
     rendered_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), nullable=False)
     # Optional summary text for future analytics/debug notes.
     # I planned to store quick render summaries here but haven't wired that in yet.
     summary: Mapped[Optional[str]] = mapped_column(Text)
+
+    __table_args__ = (
+        Index("ix_observation_log_rendered_at", "rendered_at"),
+    )
+
+class WeatherCache(Base):
+    __tablename__ = "weather_cache"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # Same layout as the practice Core table, but the key is the normalized
+    # coordinates + provider + kind, so city is only kept as a label.
+    city: Mapped[Optional[str]] = mapped_column(String(120))
+    lat: Mapped[float] = mapped_column(Float, nullable=False)
+    lon: Mapped[float] = mapped_column(Float, nullable=False)
+    provider: Mapped[str] = mapped_column(String(40), nullable=False)   # e.g. "open-meteo", "openweather"
+    kind: Mapped[str] = mapped_column(String(20), nullable=False)       # e.g. "forecast", "current"
+    # Raw JSON from the provider, or JSON null when payload_blob holds it
+    # packed (services/forecast_codec.py).
+    payload: Mapped[Optional[dict]] = mapped_column(JSON, nullable=False)
+    payload_blob: Mapped[Optional[bytes]] = mapped_column(LargeBinary)
+    fetched_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ux_weather_cache_key", "lat", "lon", "provider", "kind", unique=True),
+        Index("ix_weather_cache_fetched_at", "fetched_at"),
+    )
+
+class GeocodeCache(Base):
+    __tablename__ = "geocode_cache"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # Normalized (lowercased, single-spaced) query and upper-case country code,
+    # "" when the search had no country.
+    query: Mapped[str] = mapped_column(String(200), nullable=False)
+    country: Mapped[str] = mapped_column(String(8), nullable=False, default="")
+    # The limit the results were fetched with; bigger requests refetch.
+    result_limit: Mapped[int] = mapped_column(Integer, nullable=False)
+    # List of {name, state, country, lat, lon}; [] is a cached "no results".
+    results: Mapped[list] = mapped_column(JSON, nullable=False)
+    fetched_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ux_geocode_cache_key", "query", "country", unique=True),
+        Index("ix_geocode_cache_fetched_at", "fetched_at"),
+    )
+
+# Rollups: updated in the same transaction that writes a batch of SearchEvent
+# rows, and rebuildable from scratch (services/rollups.py).
+class CitySearchRollup(Base):
+    __tablename__ = "city_search_rollup"
+    city: Mapped[str] = mapped_column(String(120), primary_key=True)
+    search_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_searched_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+
+    __table_args__ = (
+        Index("ix_city_search_rollup_count", "search_count"),
+    )
+
+class DailySearchRollup(Base):
+    __tablename__ = "daily_search_rollup"
+    day: Mapped[date] = mapped_column(Date, primary_key=True)   # UTC day
+    search_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+class SearchArchiveRollup(Base):
+    __tablename__ = "search_archive_rollup"
+    day: Mapped[date] = mapped_column(Date, primary_key=True)   # UTC day
+    city: Mapped[str] = mapped_column(String(120), primary_key=True)
+    search_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_searched_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+    version: Mapped[int] = mapped_column(Integer, primary_key=True)
+    description: Mapped[str] = mapped_column(String(200), nullable=False)
+    applied_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), nullable=False)
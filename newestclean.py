@@ -1,25 +1,43 @@
 # newestclean.py 
 from services.weather_service import (
-    fetch_forecast_data,
-    get_current_weather,
-    organize_weekly_forecast,
-    hourly_forcast_list_f,
-    current_hour_description,
-    print_temperature
+    cached_forecast_data,
+    iter_cached_forecasts,
+    print_temperature,
+    PROVIDER_CHAINS
 )
+from services.forecast_frame import ForecastFrame
 
-from flask import Flask, request, render_template, flash
-import os, time, requests, pytz, difflib
+from flask import (
+    Flask, request, render_template, flash, jsonify, redirect, url_for, make_response,
+    Response, stream_with_context,
+)
+import os, json, requests, difflib
 from datetime import datetime
-from timezonefinder import TimezoneFinder
 from dotenv import load_dotenv
 import config
 
 from flask_login import LoginManager, current_user, login_required
-from sqlalchemy import func, select, inspect
+from sqlalchemy import select
 
-from models_core import init_db, get_session, User, SearchEvent
+from models_core import (
+    init_app as init_db_app, get_session, pool_stats,
+    SearchEvent, CitySearchRollup,
+)
+from migrations import migrate, current_schema
 from auth import bp as auth_bp
+from services.cache import weather_cache, normalize_coord, STALE_KEY
+from services.fanout import imap_unordered
+from services.timezone_service import resolve_timezone, cache_info as timezone_cache_info
+from services.geocode_cache import geocode_cache
+from services.gazetteer import load_configured as load_gazetteer
+from services.singleflight import FlightTimeout
+from services.prewarm import start_in_process as start_prewarmer
+from services.search_recorder import search_recorder
+from services import rollups
+from services.identity_cache import identity_cache
+from services.render_cache import render_cache, render_key, make_etag
+from services import assets, metrics, profiling
+from services.metrics import span
 
 # Main Flask app for the weather dashboard:
 # - Handles city search, geocoding, API calls, theming, and analytics.
@@ -35,16 +53,24 @@ app = Flask(__name__, template_folder="templates", static_folder="static")
 app.secret_key = os.getenv("FLASK_SECRET", "dev")
 
 #  DB + Login setup 
-init_db()
+# Applies pending schema migrations and takes the schema snapshot that
+# routes read via current_schema().
+migrate()
+init_db_app(app)
+rollups.ensure_built()
+
+# Background refresh of popular locations (off unless PREWARM_* says so).
+prewarmer = start_prewarmer()
 
 login_manager = LoginManager()
 login_manager.login_view = "auth.login"  
 login_manager.init_app(app)
 
+# Served from the identity cache, so logged-in page views don't query the
+# user table on every request.
 @login_manager.user_loader
 def load_user(user_id: str):
-    db = get_session()
-    return db.get(User, int(user_id))
+    return identity_cache.get(int(user_id))
 
 @app.context_processor
 def inject_current_user():
@@ -52,45 +78,30 @@ def inject_current_user():
 
 app.register_blueprint(auth_bp)
 
+# Fingerprinted static files (/assets/...) and the asset_url /
+# background_style template helpers. Run build_assets.py to produce them.
+assets.init_app(app)
 
-LIMIT = config.LIMIT
-DAYS_OF_WEEK = config.DAYS_OF_WEEK
-
-
-def future_day_gen():
-    idx = DAYS_OF_WEEK.index(time.strftime("%A", time.localtime()).upper())
-    while True:
-        idx = (idx + 1) % 7
-        yield DAYS_OF_WEEK[idx]
-
-_future_day = future_day_gen()
+# Server-Timing header on every response and Prometheus text at /metrics.
+metrics.init_app(app)
 
-def future_day():
-    return next(_future_day)
-
-
-def organize_rain_and_sun(data):
-    return data["daily"]["rain_sum"][0], data["daily"]["sunrise"][0], data["daily"]["sunset"][0]
+# Admin-triggered or sampled request profiles at /debug/profiles (off by default).
+profiling.init_app(app)
 
 
+LIMIT = config.LIMIT
 
+# Local city index, None unless GAZETTEER_PATH is set.
+gazetteer = load_gazetteer()
 
-def organize_humidity(data):
-    humidity = data["hourly"]["relative_humidity_2m"]
-    n_days = len(humidity) // 24
-    week_humid = []
-    for day in range(n_days):
-        s, e = day * 24, day * 24 + 24
-        avg = round(sum(humidity[s:e]) / 24, 2)
-        week_humid.append((future_day(), avg))
-    return week_humid
 
 def get_coordinates(city, country):
-    url = f"https://api.openweathermap.org/geo/1.0/direct?q={city},{country}&limit={LIMIT}&appid={API_KEY}"
+    if gazetteer is not None:
+        local = gazetteer.lookup(city, country, limit=LIMIT, exact_only=True)
+        if local:
+            return local[0]["lat"], local[0]["lon"]
     try:
-        r = requests.get(url, timeout=10)
-        r.raise_for_status()
-        data = r.json()
+        data = _owm_query(city, limit=LIMIT, country=country)
         if data:
             return data[0]["lat"], data[0]["lon"]
         return False, "Invalid coordinate found"
@@ -183,13 +194,10 @@ def get_theme_group(image_type):
     if image_type in special: return "special_case"
     return "dark_and_soft"
 
-def get_local_time(lat, lon):
-    tf = TimezoneFinder()
-    tz_str = tf.timezone_at(lng=lon, lat=lat)
-    if tz_str is None:
-        raise ValueError("Could not determine time zone for the given location.")
-    tz = pytz.timezone(tz_str)
-    return datetime.now(tz)
+# tz_name is the zone Open-Meteo returned with the forecast; when it is set
+# the coordinate lookup is skipped (see services/timezone_service.py).
+def get_local_time(lat, lon, tz_name=None):
+    return datetime.now(resolve_timezone(lat, lon, tz_name))
 
 def format_time_for_display(ts: str):
     hhmm = ts[11:16]
@@ -215,10 +223,11 @@ def _is_admin_like(name: str) -> bool:
 def _normalize_city(s: str) -> str:
     return "".join((s or "").lower().split())
 
-def _owm_query(q: str, limit=7):
-    url = "https://api.openweathermap.org/geo/1.0/direct"
-    params = {"q": q, "limit": limit, "appid": API_KEY}
-    r = requests.get(url, params=params, timeout=10)
+def _owm_fetch(q: str, country: str, limit: int):
+    url = f"{config.OPENWEATHER_BASE_URL}/geo/1.0/direct"
+    params = {"q": f"{q},{country}" if country else q, "limit": limit, "appid": API_KEY}
+    with span("upstream.owm-geocode"):
+        r = requests.get(url, params=params, timeout=10, hooks={"response": metrics.count_response})
     r.raise_for_status()
     data = r.json() or []
     out = []
@@ -232,12 +241,30 @@ def _owm_query(q: str, limit=7):
         })
     return out
 
+# Every geocoding lookup goes through the cache (including the broadening
+# terms in search_locations), so repeat and mistyped searches are free, and
+# identical lookups running at the same time share one request.
+def _owm_query(q: str, limit=7, country=""):
+    try:
+        return geocode_cache.lookup(q, country, limit, _owm_fetch)
+    except FlightTimeout as e:
+        # Waited too long on someone else's identical lookup; callers
+        # handle that like any other request timeout.
+        raise requests.Timeout(str(e)) from e
+
 def search_locations(city, limit=7):
 
     city = (city or "").strip()
     if len(city) < 2:
         return []
 
+    # The local index answers most searches (typos included) without any
+    # round trip; OWM is only asked about places it doesn't know.
+    if gazetteer is not None:
+        local = gazetteer.lookup(city, limit=limit)
+        if local:
+            return local
+
     try:
         primary = _owm_query(city, limit=limit)
         if primary:
@@ -278,25 +305,23 @@ def search_locations(city, limit=7):
     target = _normalize_city(city)
 
     scored = []
-    for item in raw_candidates:
-        name_norm = _normalize_city(item.get("name", ""))
-        sim = difflib.SequenceMatcher(None, target, name_norm).ratio()
-        bonus = 0.02 if (item.get("country") == "US" and item.get("state")) else 0.0
-        scored.append((sim + bonus, sim, item))
+    with span("geocode.rank"):
+        for item in raw_candidates:
+            name_norm = _normalize_city(item.get("name", ""))
+            sim = difflib.SequenceMatcher(None, target, name_norm).ratio()
+            bonus = 0.02 if (item.get("country") == "US" and item.get("state")) else 0.0
+            scored.append((sim + bonus, sim, item))
 
     scored.sort(key=lambda t: t[0], reverse=True)
 
-    BEST_SIM_THRESHOLD = 0.55  
     best_sim = scored[0][1]
-    if best_sim < BEST_SIM_THRESHOLD:
+    if best_sim < config.FUZZY_BEST_SIM_THRESHOLD:
         return []
 
-    
-    CLOSE_MARGIN = 0.15
     filtered = [
         item
         for _total, sim, item in scored
-        if sim >= best_sim - CLOSE_MARGIN
+        if sim >= best_sim - config.FUZZY_CLOSE_MARGIN
     ]
 
     return filtered[:limit]
@@ -371,7 +396,8 @@ def get_weather_page():
                 return render_template("error.html", message="Please provide a city (and optional country).")
 
             if city and not country:
-                candidates = search_locations(city, limit=7)
+                with span("geocode"):
+                    candidates = search_locations(city, limit=7)
 
                 if not candidates:
                     return render_template("error.html", message=f"No results for “{city}”.")
@@ -391,100 +417,384 @@ def get_weather_page():
             else:
                 if not city or not country:
                     return render_template("error.html", message="Please provide both city and country.")
-                coordinates = get_coordinates(city, country)
+                with span("geocode"):
+                    coordinates = get_coordinates(city, country)
                 if coordinates[0] is False:
                     return render_template("error.html", message="Invalid Location")
                 lat, lon = coordinates
 
-        ow = get_current_weather(lat, lon)
-        om = fetch_forecast_data(lat, lon)
-        if not ow or not om:
-            return render_template("error.html", message="Weather data could not be loaded.")
-
-        local_time = get_local_time(lat, lon)
-
-        description = current_hour_description(om, local_time)
-
-        temp_c = om["daily"]["temperature_2m_max"][0]
-        temp_k = temp_c + 273.15
-        temp_display, temp_unit = print_temperature(temp_k, temp_type)
-
-        humidity_data = organize_humidity(om)
-        rain, sunrise, sunset = organize_rain_and_sun(om)
-        weekly_forcast = organize_weekly_forecast(om, temp_type)
-        hourly_forecast = hourly_forcast_list_f(om, local_time, temp_type)
-        sunrise_time = extract_time_only(sunrise)
-        sunset_time = extract_time_only(sunset)
-
-        display_sunrise = format_time_for_display(sunrise)
-        display_sunset = format_time_for_display(sunset)
-
-        try:
-            temp_num = float(temp_display.replace("°C","").replace("°F",""))
-        except:
-            temp_num = temp_c
-
-        image_type = image_type_f(
-            temp_num,
-            description,
-            temp_unit,
-            now_local=local_time,
-            sunrise_time=sunrise_time,
-            sunset_time=sunset_time
-        )
-        theme_group = get_theme_group(image_type)
-
-        try:
-            db = get_session()
-            db.add(SearchEvent(
-                user_id=current_user.id if current_user.is_authenticated else None, 
+        # Queued and written in batches by a background thread, so the
+        # search never waits on the database (that write is the
+        # "search_flush" stage).
+        with span("record"):
+            search_recorder.record(
+                user_id=current_user.id if current_user.is_authenticated else None,
                 city=city,
                 country=country or None,
                 lat=lat,
                 lon=lon,
                 temp_unit=(temp_type or "c")[:1].lower()
-            ))
-            db.commit()
-        except Exception:
-            pass  
-        return render_template(
-            "mine.html",
-            image_type=image_type,
-            city=city, country=country,
-            temperature=temp_display,
-            description=description,
-            humidity_data=humidity_data,
-            rain=rain,
-            sunrise=display_sunrise,
-            sunset=display_sunset,
-            weekly_forcast=weekly_forcast,
-            hourly_forecast=hourly_forecast,
-            weathercode_map=config.WEATHERCODE_MAP,
-            theme_group=theme_group,
-            temp_type=temp_type
-        )
+            )
+        # Post/Redirect/Get: the results live at a plain GET URL that the
+        # browser (and any proxy) can cache, and reloading doesn't re-search.
+        return redirect(results_url(lat, lon, city, country, temp_type), code=303)
 
     return render_template("weather_form.html")
 
-def table_has_column(session, table_name: str, column_name: str) -> bool:
+
+def results_url(lat, lon, city, country, temp_type):
+    return url_for(
+        "weather_results",
+        lat=normalize_coord(lat), lon=normalize_coord(lon),
+        unit=temp_type, name=city, country=country or None,
+    )
+
+
+class WeatherUnavailable(Exception):
+    pass
+
+
+def build_weather_view(lat, lon, temp_type):
+    """
+    The data behind a results page (shared by the HTML page and the JSON
+    API). Raises WeatherUnavailable if the forecast can't be loaded.
     """
-    Returns True if the given column exists in the given table,
-    using SQLAlchemy's inspector (works cleanly with SQLite).
+    # Everything on the page comes from the Open-Meteo "page" profile
+    # (services/weather_service.py), one call made right here. Its time limit
+    # is the provider chain's PROVIDER_BUDGET; past that, or with the circuit
+    # open, the cache serves a stale copy if it has one.
+    with span("forecast"):
+        om = cached_forecast_data(lat, lon, "page")
+    if not om:
+        raise WeatherUnavailable()
+    return weather_view(om, lat, lon, temp_type)
+
+
+def weather_view(om, lat, lon, temp_type):
+    """
+    View data computed from one forecast payload. The weekly/hourly lists are
+    left to the caller via view["frame"], so a cached page or a trimmed API
+    response doesn't compute them.
     """
     try:
-        insp = inspect(session.bind)
-        cols = [c["name"].lower() for c in insp.get_columns(table_name)]
-        return column_name.lower() in cols
-    except Exception:
-        return False
+        with span("local_time"):
+            local_time = get_local_time(lat, lon, om.get("timezone"))
+    except ValueError:
+        raise WeatherUnavailable()
+
+    with span("transform"):
+        frame = ForecastFrame(om)
+        description = frame.current_description(local_time)
+
+    temp_c = om["daily"]["temperature_2m_max"][0]
+    temp_k = temp_c + 273.15
+    temp_display, temp_unit = print_temperature(temp_k, temp_type)
+
+    sunrise, sunset = om["daily"]["sunrise"][0], om["daily"]["sunset"][0]
+
+    try:
+        temp_num = float(temp_display.replace("°C","").replace("°F",""))
+    except:
+        temp_num = temp_c
+
+    image_type = image_type_f(
+        temp_num,
+        description,
+        temp_unit,
+        now_local=local_time,
+        sunrise_time=extract_time_only(sunrise),
+        sunset_time=extract_time_only(sunset)
+    )
+    return {
+        "frame": frame,
+        "timezone": om.get("timezone"),
+        "local_time": local_time,
+        # Set when the provider is down and this is the last good payload.
+        "stale": bool(om.get(STALE_KEY)),
+        "description": description,
+        "temperature": temp_display,
+        "sunrise": sunrise,
+        "sunset": sunset,
+        "image_type": image_type,
+        "theme_group": get_theme_group(image_type),
+    }
+
+
+# Results page: GET /weather?lat=..&lon=..&unit=c&name=..&country=..
+# Rendered pages are cached per location/unit/theme/local hour (see
+# services/render_cache.py) with a strong ETag, so repeat views are either a
+# 304 or a cached body, and never re-render the template.
+@app.route("/weather")
+def weather_results():
+    try:
+        lat = float(request.args["lat"])
+        lon = float(request.args["lon"])
+    except (KeyError, ValueError):
+        return render_template("error.html", message="Invalid Location")
+    temp_type = (request.args.get("unit") or "c").lower()
+    city = request.args.get("name") or "Selected location"
+    country = request.args.get("country") or ""
+
+    try:
+        view = build_weather_view(lat, lon, temp_type)
+    except WeatherUnavailable:
+        return render_template("error.html", message="Weather data could not be loaded.")
+    frame, local_time = view["frame"], view["local_time"]
+    stale, image_type = view["stale"], view["image_type"]
+
+    key = render_key(lat, lon, temp_type, image_type, local_time, city, country,
+                     current_user.is_authenticated, stale)
+    page = render_cache.get(key)
+    if page is None:
+        with span("transform"):
+            weekly = frame.weekly(temp_type)
+            hourly = frame.hourly_window(local_time, temp_type)
+        with span("render"):
+            html = render_template(
+                "mine.html",
+                image_type=image_type,
+                # The body is shared by every URL with the same render_key,
+                # so the toggle form gets the normalized coordinates.
+                lat=normalize_coord(lat), lon=normalize_coord(lon),
+                city=city, country=country,
+                temperature=view["temperature"],
+                description=view["description"],
+                stale=stale,
+                sunrise=format_time_for_display(view["sunrise"]),
+                sunset=format_time_for_display(view["sunset"]),
+                weekly_forcast=weekly,
+                hourly_forecast=hourly,
+                weathercode_map=config.WEATHERCODE_MAP,
+                theme_group=view["theme_group"],
+                temp_type=temp_type
+            ).encode()
+        if stale:
+            # Don't keep a fallback page around once upstream recovers.
+            page = (html, make_etag(html))
+        else:
+            page = render_cache.put(key, html, local_time)
+
+    body, etag = page
+    resp = make_response(body)
+    resp.set_etag(etag)
+    # The nav differs for logged-in users, so shared caches must key on the cookie.
+    resp.headers["Vary"] = "Cookie"
+    if stale:
+        resp.cache_control.no_cache = True
+    else:
+        resp.cache_control.max_age = render_cache.ttl_for(local_time)
+        if current_user.is_authenticated:
+            resp.cache_control.private = True
+        else:
+            resp.cache_control.public = True
+    return resp.make_conditional(request)
+
+
+# JSON API (v1): GET /api/v1/weather
+# The same data as the results page, for mobile clients and dashboards.
+#   ?lat=..&lon=..          or  ?city=..[&country=..]
+#   &unit=c|f               (default c)
+#   &sections=current,hourly,weekly,sun,theme   (default: all)
+# Responses are compact JSON with an ETag and a Cache-Control lifetime that
+# ends with the local hour, like the HTML page. Ambiguous city names get a
+# 300 with the candidates to choose from (then call again with lat/lon).
+API_SECTIONS = ("current", "hourly", "weekly", "sun", "theme")
+
+
+def api_error(message, status, **extra):
+    resp = jsonify(error=message, **extra)
+    resp.status_code = status
+    resp.cache_control.no_store = True
+    return resp
+
+
+class ApiError(Exception):
+    def __init__(self, message, status, **extra):
+        super().__init__(message)
+        self.message, self.status, self.extra = message, status, extra
+
+
+def resolve_api_location(params):
+    """(lat, lon, name, country) from lat/lon or city[/country] in `params`. Raises ApiError."""
+    if params.get("lat") not in (None, "") and params.get("lon") not in (None, ""):
+        try:
+            lat, lon = float(params["lat"]), float(params["lon"])
+        except (TypeError, ValueError):
+            raise ApiError("lat and lon must be numbers", 400)
+        return lat, lon, params.get("name"), params.get("country")
+
+    city = str(params.get("city") or "").strip()
+    country = str(params.get("country") or "").strip()
+    if not city:
+        raise ApiError("give lat and lon, or city", 400)
+    if country:
+        coordinates = get_coordinates(city, country)
+        if coordinates[0] is False:
+            raise ApiError("location not found", 404)
+        return coordinates[0], coordinates[1], city, country
+
+    candidates = search_locations(city, limit=7)
+    pick = pick_best_location(candidates, city)
+    if pick is None:
+        if not candidates:
+            raise ApiError("location not found", 404)
+        raise ApiError("ambiguous location", 300, candidates=[
+            {k: c.get(k) for k in ("name", "state", "country", "lat", "lon")} for c in candidates
+        ])
+    return float(pick["lat"]), float(pick["lon"]), pick.get("name") or city, pick.get("country") or ""
+
+
+def parse_sections(raw):
+    """Requested API sections (all by default). Raises ApiError on unknown names."""
+    wanted = [x for x in raw if x] or list(API_SECTIONS)
+    unknown = sorted(set(wanted) - set(API_SECTIONS))
+    if unknown:
+        raise ApiError("unknown sections", 400, unknown=unknown, allowed=list(API_SECTIONS))
+    return wanted
+
+
+@app.route("/api/v1/weather")
+def api_weather():
+    temp_type = (request.args.get("unit") or "c").lower()
+    if temp_type not in ("c", "f"):
+        return api_error("unit must be c or f", 400)
+    try:
+        wanted = parse_sections((request.args.get("sections") or "").split(","))
+        lat, lon, name, country = resolve_api_location(request.args)
+    except ApiError as e:
+        return api_error(e.message, e.status, **e.extra)
+
+    try:
+        view = build_weather_view(lat, lon, temp_type)
+    except WeatherUnavailable:
+        return api_error("weather data could not be loaded", 503)
+    resp = jsonify(api_view(view, wanted, temp_type, lat, lon, name, country))
+    resp.add_etag()
+    if view["stale"]:
+        resp.cache_control.no_cache = True
+    else:
+        resp.cache_control.public = True
+        resp.cache_control.max_age = render_cache.ttl_for(view["local_time"])
+    return resp.make_conditional(request)
+
+
+def api_view(view, wanted, temp_type, lat, lon, name, country):
+    frame, local_time = view["frame"], view["local_time"]
+    data = {
+        "version": 1,
+        "location": {"lat": lat, "lon": lon, "name": name, "country": country or None,
+                     "timezone": view["timezone"]},
+        "unit": temp_type,
+        "local_time": local_time.isoformat(timespec="minutes"),
+        "stale": view["stale"],
+    }
+    if "current" in wanted:
+        data["current"] = {"description": view["description"], "temperature": view["temperature"]}
+    if "hourly" in wanted:
+        data["hourly"] = frame.hourly_window(local_time, temp_type)
+    if "weekly" in wanted:
+        weekly = frame.weekly(temp_type)
+        if frame.rain_chance is None:
+            # The page profile doesn't fetch precipitation; leave the key out
+            # rather than publish a field that is always null.
+            weekly = [{k: v for k, v in day.items() if k != "rain"} for day in weekly]
+        data["weekly"] = weekly
+    if "sun" in wanted:
+        data["sun"] = {
+            "sunrise": view["sunrise"], "sunset": view["sunset"],
+            "sunrise_display": format_time_for_display(view["sunrise"]),
+            "sunset_display": format_time_for_display(view["sunset"]),
+        }
+    if "theme" in wanted:
+        data["theme"] = {"image_type": view["image_type"], "theme_group": view["theme_group"]}
+    return data
+
+
+# Batch API: POST /api/v1/weather/batch
+# Body: {"locations": [{"lat": .., "lon": .., "name": ..} or {"city": .., "country": ..}, ...],
+#        "unit": "c", "sections": ["current", "sun"]}
+# Streams NDJSON, one line per distinct location as soon as it is ready:
+#   {"indexes": [0, 3], "location": {...}, "current": {...}, ...}
+#   {"indexes": [1], "error": "location not found", "status": 404}
+# Entries that resolve to the same (rounded) coordinates are fetched once.
+# Forecasts come from iter_cached_forecasts (cache first, then multi-location
+# Open-Meteo calls); the "summary" profile is used unless hourly/weekly
+# sections are asked for.
+@app.route("/api/v1/weather/batch", methods=["POST"])
+def api_weather_batch():
+    body = request.get_json(silent=True) or {}
+    locations = body.get("locations")
+    if not isinstance(locations, list) or not locations:
+        return api_error("locations must be a non-empty list", 400)
+    if len(locations) > config.BATCH_MAX_LOCATIONS:
+        return api_error(f"at most {config.BATCH_MAX_LOCATIONS} locations per batch", 400)
+    temp_type = str(body.get("unit") or "c").lower()
+    if temp_type not in ("c", "f"):
+        return api_error("unit must be c or f", 400)
+    sections = body.get("sections") or []
+    if isinstance(sections, str):
+        # The comma-separated form the GET endpoint takes.
+        sections = sections.split(",")
+    if not isinstance(sections, list) or not all(isinstance(x, str) for x in sections):
+        return api_error("sections must be a list of names", 400)
+    try:
+        wanted = parse_sections(sections)
+    except ApiError as e:
+        return api_error(e.message, e.status, **e.extra)
+    profile = "page" if {"hourly", "weekly"} & set(wanted) else "summary"
+
+    def resolve(item):
+        _i, params = item
+        if not isinstance(params, dict):
+            raise ApiError("each location must be an object", 400)
+        return resolve_api_location(params)
+
+    def line(obj):
+        return json.dumps(obj, separators=(",", ":")) + "\n"
+
+    def generate():
+        # 1. Coordinates for every entry (geocoding runs in parallel),
+        #    grouped so duplicates share one forecast.
+        groups = {}
+        for (i, _params), found, err in imap_unordered(resolve, enumerate(locations), config.BATCH_MAX_PARALLEL):
+            if err is not None:
+                if isinstance(err, ApiError):
+                    yield line({"indexes": [i], "error": err.message, "status": err.status, **err.extra})
+                else:
+                    yield line({"indexes": [i], "error": "location lookup failed", "status": 502})
+                continue
+            lat, lon, name, country = found
+            group = groups.setdefault((normalize_coord(lat), normalize_coord(lon)),
+                                      {"indexes": [], "name": name, "country": country})
+            group["indexes"].append(i)
+
+        # 2. Forecasts, in the order they arrive.
+        for (lat, lon), om in iter_cached_forecasts(list(groups), profile):
+            group = groups[(lat, lon)]
+            indexes = sorted(group["indexes"])
+            try:
+                if om is None:
+                    raise WeatherUnavailable()
+                view = weather_view(om, lat, lon, temp_type)
+            except WeatherUnavailable:
+                yield line({"indexes": indexes, "error": "weather data could not be loaded", "status": 503})
+                continue
+            yield line({"indexes": indexes,
+                        **api_view(view, wanted, temp_type, lat, lon, group["name"], group["country"])})
+
+    resp = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    resp.cache_control.no_store = True
+    return resp
 
 
 # Analytics page:
 # Runs database queries to show:
 # - The top most-searched cities across all users (city + search count)
 # - The logged-in user's own recent searches (latest 15 entries)
-# This route requires login and uses SQL aggregate functions (COUNT, GROUP BY)
-# to summarize real usage data from the SearchEvent table.
+# This route requires login. The city counts come from the city_search_rollup
+# table (kept current by services/rollups.py as events are written), and the
+# recent searches use the (user_id, created_at) index, so neither query grows
+# with the size of the SearchEvent table.
 
 @app.route("/analytics")
 @login_required
@@ -492,13 +802,13 @@ def analytics():
     db = get_session()
 
     top_cities = db.execute(
-        select(SearchEvent.city, func.count(SearchEvent.id))
-        .group_by(SearchEvent.city)
-        .order_by(func.count(SearchEvent.id).desc())
+        select(CitySearchRollup.city, CitySearchRollup.search_count)
+        .order_by(CitySearchRollup.search_count.desc())
         .limit(10)
     ).all()
 
-    has_country = table_has_column(db, "search_event", "country")
+    # Read from the startup schema snapshot (migrations.py), no reflection here.
+    has_country = current_schema().has_column("search_event", "country")
 
     if has_country:
         recent = db.execute(
@@ -518,6 +828,77 @@ def analytics():
 
     return render_template("analytics.html", top_cities=top_cities, recent=recent)
 
+# Cache counters (hits/misses/evictions per tier) for sizing CACHE_MAX_ENTRIES,
+# plus provider circuit/latency numbers,
+# and the TTLs in config.py.
+@app.route("/cache/stats")
+@login_required
+def cache_stats():
+    return jsonify(
+        weather=weather_cache.stats(),
+        geocode=geocode_cache.stats(),
+        search_events=search_recorder.stats(),
+        identity=identity_cache.stats(),
+        providers={chain.name: chain.stats() for chain in PROVIDER_CHAINS},
+        render=render_cache.stats(),
+        timezone=timezone_cache_info(),
+    )
+
+# The counters behind /cache/stats, exported on /metrics at scrape time.
+_CACHE_EVENTS = ("hits", "misses", "evictions", "expirations")
+
+
+@metrics.collector
+def _cache_metrics():
+    events, entries = [], []
+    for name, stats in (("weather", weather_cache.stats()), ("geocode", geocode_cache.stats()),
+                        ("render", {"memory": render_cache.stats()}),
+                        ("identity", {"memory": identity_cache.stats()})):
+        memory = stats["memory"]
+        entries.append(({"cache": name}, memory["entries"]))
+        events += [({"cache": name, "event": e}, memory[e]) for e in _CACHE_EVENTS]
+        events += [({"cache": name, "event": e}, stats[e])
+                   for e in ("fetches", "fetch_failures", "stale_served", "revalidations", "negative_hits")
+                   if e in stats]
+        for e, value in (stats.get("persistent") or {}).items():
+            events.append(({"cache": name, "event": f"persistent_{e}"}, value))
+    timezone = timezone_cache_info()
+    entries.append(({"cache": "timezone"}, timezone["entries"]))
+    events += [({"cache": "timezone", "event": e}, timezone[e]) for e in ("hits", "misses")]
+    yield "weather_cache_events_total", "counter", "Cache lookups by outcome.", events
+    yield "weather_cache_entries", "gauge", "Entries in the in-memory tier.", entries
+
+
+@metrics.collector
+def _provider_metrics():
+    calls, served, open_ = [], [], []
+    for chain in PROVIDER_CHAINS:
+        stats = chain.stats()
+        for provider, p in stats["providers"].items():
+            labels = {"chain": chain.name, "provider": provider}
+            calls += [(dict(labels, outcome=o), p[o]) for o in ("calls", "failures", "rejected")]
+            served.append((labels, stats["served"][provider]))
+            open_.append((labels, int(p["breaker"]["state"] != "closed")))
+    yield "weather_provider_calls_total", "counter", "Provider calls, failures and calls skipped by an open circuit.", calls
+    yield "weather_provider_served_total", "counter", "Payloads each provider served for its chain.", served
+    yield "weather_provider_circuit_open", "gauge", "1 while the provider's circuit is open or half-open.", open_
+
+
+@metrics.collector
+def _search_event_metrics():
+    stats = search_recorder.stats()
+    yield ("weather_search_events_total", "counter", "Search events by outcome.",
+           [({"event": e}, stats[e]) for e in ("enqueued", "written", "dropped", "failed")])
+    yield "weather_search_queue_depth", "gauge", "Search events waiting to be written.", [({}, stats["queue_depth"])]
+
+
+# Connection pool numbers (checked out, overflow, peak) for diagnosing
+# connection starvation.
+@app.route("/db/stats")
+@login_required
+def db_stats():
+    return jsonify(pool_stats())
+
 @app.errorhandler(404)
 def not_found_error(e):
     return render_template("error.html", message="404 - Page Not Found"), 404
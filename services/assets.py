@@ -0,0 +1,155 @@
+# services/assets.py
+# Runtime side of the static asset pipeline (build step: build_assets.py).
+#
+# build_assets.py writes fingerprinted copies of the CSS/JS/images into
+# ASSET_DIST_DIR plus a manifest.json mapping "me.css" -> "me.<hash>.css".
+# Templates call asset_url("me.css") and get /assets/me.<hash>.css, served
+# with a year-long immutable Cache-Control (the name changes when the bytes
+# do) and a precompressed .br/.gz sibling when the client accepts it.
+#
+# The theme backgrounds are CSS (body.<image_type> in me.css), so instead of
+# srcset they get an inline <style> from background_style(image_type): an
+# image-set() of AVIF/WebP/JPEG per width, with a media query per width.
+#
+# Without a manifest (build not run) everything falls back to the plain
+# /static URLs and the backgrounds from me.css.
+
+import json
+import logging
+import mimetypes
+import os
+
+from flask import request, send_from_directory, url_for
+from markupsafe import Markup
+
+import config
+
+log = logging.getLogger(__name__)
+
+_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+# image-set() order: browsers take the first type they support.
+_TYPE_ORDER = {"image/avif": 0, "image/webp": 1, "image/jpeg": 2}
+
+
+def _load_manifest(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as fh:
+            manifest = json.load(fh)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError):
+        log.exception("assets: unreadable manifest %s", path)
+        return {}
+    if manifest.get("version") != 1:
+        log.warning("assets: ignoring manifest %s with version %r", path, manifest.get("version"))
+        return {}
+    return manifest
+
+
+class AssetManifest:
+    def __init__(self, dist_dir: str, static_dir: str, manifest: dict):
+        self.dist_dir = dist_dir
+        self.static_dir = static_dir
+        self.files = manifest.get("files", {})
+        self.images = manifest.get("images", {})
+        self.backgrounds = manifest.get("backgrounds", {})
+        self.compressed = set(manifest.get("compressed", ()))
+        self._static_versions = {}
+        self._styles = {}
+
+    def url(self, path: str) -> str:
+        built = self.files.get(path)
+        if built:
+            return url_for("asset_file", filename=built)
+        return url_for("static", filename=path, v=self._static_version(path))
+
+    def _static_version(self, path: str):
+        # Unbuilt fallback: bust browser caches on change via the mtime.
+        if path not in self._static_versions:
+            try:
+                self._static_versions[path] = int(os.path.getmtime(os.path.join(self.static_dir, path)))
+            except OSError:
+                self._static_versions[path] = None
+        return self._static_versions[path]
+
+    def srcset(self, path: str, mime: str) -> str:
+        """'url 640w, url 1280w, ...' for one format of a built image, or ''."""
+        return ", ".join(
+            f"{url_for('asset_file', filename=v['path'])} {v['width']}w"
+            for v in self.images.get(path, ()) if v["type"] == mime
+        )
+
+    def background_style(self, image_type: str) -> Markup:
+        """Inline <style> with responsive image-set() backgrounds for body.<image_type>."""
+        if image_type not in self._styles:
+            rules = []
+            for selector, path in self.backgrounds.items():
+                if _selector_class(selector) == image_type and path in self.images:
+                    rules.extend(self._background_rules(selector, self.images[path]))
+            self._styles[image_type] = Markup(f"<style>{''.join(rules)}</style>") if rules else Markup("")
+        return self._styles[image_type]
+
+    def _background_rules(self, selector: str, variants: list):
+        by_width = {}
+        for v in variants:
+            by_width.setdefault(v["width"], []).append(v)
+        widths = sorted(by_width)
+        for i, width in enumerate(widths):
+            ordered = sorted(by_width[width], key=lambda v: _TYPE_ORDER.get(v["type"], 9))
+            urls = [(url_for("asset_file", filename=v["path"]), v["type"]) for v in ordered]
+            # Plain url() first for browsers without typed image-set().
+            fallback = urls[-1][0]
+            options = ", ".join(f'url("{u}") type("{t}")' for u, t in urls)
+            rule = (f'{selector}{{background-image:url("{fallback}");'
+                    f'background-image:image-set({options})}}')
+            if i:
+                # A 2x phone gets the next width up from the one its CSS width fits.
+                rule = (f"@media (min-width:{widths[i - 1] + 1}px),"
+                        f"(min-resolution:2dppx) and (min-width:{widths[i - 1] // 2 + 1}px){{{rule}}}")
+            yield rule
+
+    def send(self, filename: str):
+        encoding = None
+        if filename in self.compressed:
+            accepted = request.headers.get("Accept-Encoding", "")
+            for name, suffix in _ENCODINGS:
+                if name in accepted and os.path.isfile(os.path.join(self.dist_dir, filename + suffix)):
+                    encoding = (name, suffix)
+                    break
+        if encoding:
+            # mimetype from the original name, not the .br/.gz one.
+            resp = send_from_directory(self.dist_dir, filename + encoding[1], max_age=config.ASSET_MAX_AGE,
+                                       mimetype=_guess_type(filename))
+            resp.headers["Content-Encoding"] = encoding[0]
+        else:
+            resp = send_from_directory(self.dist_dir, filename, max_age=config.ASSET_MAX_AGE)
+        if filename in self.compressed:
+            resp.vary.add("Accept-Encoding")
+        resp.headers["Cache-Control"] = f"public, max-age={config.ASSET_MAX_AGE}, immutable"
+        return resp
+
+
+def _selector_class(selector: str):
+    """'body.coldcase::before' -> 'coldcase'."""
+    head = selector.split("::", 1)[0].strip()
+    return head[len("body."):] if head.startswith("body.") else None
+
+
+def _guess_type(filename: str) -> str:
+    return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+
+def init_app(app) -> AssetManifest:
+    static_dir = app.static_folder
+    dist_dir = os.path.join(app.root_path, config.ASSET_DIST_DIR)
+    assets = AssetManifest(dist_dir, static_dir, _load_manifest(os.path.join(dist_dir, "manifest.json")))
+    if assets.files:
+        log.info("assets: %d fingerprinted files from %s", len(assets.files), dist_dir)
+
+    app.add_url_rule("/assets/<path:filename>", "asset_file", assets.send)
+    app.jinja_env.globals.update(
+        asset_url=assets.url,
+        asset_srcset=assets.srcset,
+        background_style=assets.background_style,
+    )
+    return assets
@@ -0,0 +1,418 @@
+# services/cache.py
+# Two-tier cache for upstream weather payloads:
+# - Memory tier: a small in-process LRU with TTL + size bounds, so a popular
+#   city is served without leaving the worker.
+# - Persistent tier: the weather_cache table, so entries survive restarts and
+#   are shared between gunicorn workers.
+# Keys are (provider, kind, lat, lon) with the coordinates rounded, so two
+# searches for the same place land on the same entry.
+# Forecast payloads can be stored packed (services/forecast_codec.py), in the
+# table (CACHE_BINARY_PAYLOADS) and optionally in memory (CACHE_MEMORY_COMPACT).
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, delete
+from sqlalchemy.exc import SQLAlchemyError
+
+import config
+from models_core import new_session, WeatherCache
+from services import forecast_codec
+from services.singleflight import FlightTimeout, upstream_flight
+
+
+# Added to a payload served past its TTL.
+STALE_KEY = "_stale"
+
+# Background refreshes for stale entries (see TwoTierCache._revalidate).
+_REVALIDATE_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="revalidate")
+
+
+def _utcnow():
+    # Naive UTC, to match what SQLite stores for DateTime columns.
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def normalize_coord(value) -> float:
+    # "+ 0.0" turns -0.0 into 0.0 so both round to the same key.
+    return round(float(value), config.CACHE_COORD_DECIMALS) + 0.0
+
+
+def make_key(provider: str, kind: str, lat, lon):
+    return (provider, kind, normalize_coord(lat), normalize_coord(lon))
+
+
+class LRUCache:
+    """
+    Thread-safe LRU with a per-entry expiry time.
+    Expired entries are dropped lazily when they are looked up, and the
+    least recently used entry is evicted once max_entries is reached.
+    """
+
+    def __init__(self, max_entries: int, default_ttl: float):
+        self.max_entries = max(1, int(max_entries))
+        self.default_ttl = default_ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def peek(self, key):
+        """Value for key if present and unexpired. Doesn't count as a lookup or touch LRU order."""
+        entry = self._data.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return None if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class PersistentCache:
+    """
+    Cache tier backed by the weather_cache table.
+    Any database error is counted and treated as a miss, so a locked or
+    missing table never breaks a weather page.
+    """
+
+    def __init__(self, binary: bool = False):
+        self.binary = binary
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.errors = 0
+
+    def get(self, key, max_age: float):
+        """Return (payload, fetched_at) if a fresh row exists, else None."""
+        provider, kind, lat, lon = key
+        db = new_session()
+        try:
+            row = db.execute(
+                select(WeatherCache.payload, WeatherCache.payload_blob, WeatherCache.fetched_at)
+                .where(
+                    WeatherCache.lat == lat,
+                    WeatherCache.lon == lon,
+                    WeatherCache.provider == provider,
+                    WeatherCache.kind == kind,
+                )
+            ).first()
+        except SQLAlchemyError:
+            self.errors += 1
+            return None
+        finally:
+            db.close()
+
+        if row is None or (_utcnow() - row.fetched_at).total_seconds() > max_age:
+            self.misses += 1
+            return None
+        payload = row.payload
+        if row.payload_blob is not None:
+            try:
+                payload = forecast_codec.decode(row.payload_blob)
+            except forecast_codec.CodecError:
+                # Written by a newer codec version (or corrupt): refetch.
+                self.errors += 1
+                return None
+        self.hits += 1
+        return payload, row.fetched_at
+
+    def fetched_at(self, key):
+        """When the row for key was last written, or None. Doesn't count as a lookup."""
+        provider, kind, lat, lon = key
+        db = new_session()
+        try:
+            return db.execute(
+                select(WeatherCache.fetched_at).where(
+                    WeatherCache.lat == lat,
+                    WeatherCache.lon == lon,
+                    WeatherCache.provider == provider,
+                    WeatherCache.kind == kind,
+                )
+            ).scalar_one_or_none()
+        except SQLAlchemyError:
+            self.errors += 1
+            return None
+        finally:
+            db.close()
+
+    def set(self, key, payload, city=None):
+        provider, kind, lat, lon = key
+        blob = None
+        if self.binary and forecast_codec.encodable(payload):
+            blob, payload = forecast_codec.encode(payload), None
+        db = new_session()
+        try:
+            row = db.execute(
+                select(WeatherCache).where(
+                    WeatherCache.lat == lat,
+                    WeatherCache.lon == lon,
+                    WeatherCache.provider == provider,
+                    WeatherCache.kind == kind,
+                )
+            ).scalar_one_or_none()
+            if row is None:
+                db.add(WeatherCache(
+                    city=city, lat=lat, lon=lon, provider=provider, kind=kind,
+                    payload=payload, payload_blob=blob, fetched_at=_utcnow(),
+                ))
+            else:
+                row.payload = payload
+                row.payload_blob = blob
+                row.fetched_at = _utcnow()
+                if city:
+                    row.city = city
+            db.commit()
+            self.writes += 1
+        except SQLAlchemyError:
+            # Most likely another worker inserted the same key first.
+            db.rollback()
+            self.errors += 1
+        finally:
+            db.close()
+
+    def purge_older_than(self, max_age: float) -> int:
+        """Delete rows older than max_age seconds. Returns the number removed."""
+        cutoff = _utcnow() - timedelta(seconds=max_age)
+        db = new_session()
+        try:
+            result = db.execute(delete(WeatherCache).where(WeatherCache.fetched_at < cutoff))
+            db.commit()
+            return result.rowcount or 0
+        except SQLAlchemyError:
+            db.rollback()
+            self.errors += 1
+            return 0
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "errors": self.errors,
+        }
+
+
+class TwoTierCache:
+    """
+    Memory tier in front of an (optional) persistent tier.
+    A persistent hit is promoted into memory with whatever TTL it has left,
+    so both tiers expire the entry at the same moment.
+    With compact=True, encodable payloads are held in memory as packed bytes
+    and decoded on each hit.
+
+    Entries are kept stale_ttl seconds past their TTL. get() never returns
+    them, but get_or_fetch() serves one (marked with STALE_KEY) when the
+    upstream is unhealthy or the refresh fails.
+    """
+
+    def __init__(self, memory: LRUCache, store: PersistentCache = None, flight=upstream_flight,
+                 compact: bool = False, stale_ttl: float = 0):
+        self.memory = memory
+        self.store = store
+        self.flight = flight
+        self.compact = compact
+        self.stale_ttl = stale_ttl
+        self.fetches = 0
+        self.fetch_failures = 0
+        self.stale_served = 0
+        self.revalidations = 0
+        self._revalidating = set()
+        self._lock = threading.Lock()
+
+    # Memory entries are (payload, fresh_until), fresh_until on the monotonic clock.
+    def _remember(self, key, payload, fresh_for):
+        value = payload
+        if self.compact and forecast_codec.encodable(payload):
+            value = forecast_codec.encode(payload)
+        self.memory.set(key, (value, time.monotonic() + fresh_for), ttl=fresh_for + self.stale_ttl)
+
+    def _lookup(self, key, ttl):
+        """(payload, is_fresh) from either tier, stale copies included. None if absent."""
+        stale = None
+        entry = self.memory.get(key)
+        if entry is not None:
+            value, fresh_until = entry
+            payload = forecast_codec.decode(value) if isinstance(value, bytes) else value
+            if time.monotonic() < fresh_until:
+                return payload, True
+            stale = payload
+        if self.store is not None:
+            # Another worker may have refreshed the row since we cached it.
+            found = self.store.get(key, ttl + self.stale_ttl)
+            if found is not None:
+                payload, fetched_at = found
+                age = (_utcnow() - fetched_at).total_seconds()
+                if age <= ttl or stale is None:
+                    self._remember(key, payload, ttl - age)
+                    return payload, age <= ttl
+        return None if stale is None else (stale, False)
+
+    def get(self, provider, kind, lat, lon, ttl):
+        found = self._lookup(make_key(provider, kind, lat, lon), ttl)
+        return found[0] if found is not None and found[1] else None
+
+    def set(self, provider, kind, lat, lon, payload, ttl, city=None):
+        key = make_key(provider, kind, lat, lon)
+        self._remember(key, payload, ttl)
+        if self.store is not None:
+            self.store.set(key, payload, city=city)
+
+    def remaining(self, provider, kind, lat, lon, ttl):
+        """Seconds of freshness left for an entry in either tier, None if absent/expired."""
+        key = make_key(provider, kind, lat, lon)
+        entry = self.memory.peek(key)
+        if entry is not None:
+            left = entry[1] - time.monotonic()
+            if left > 0:
+                return left
+        if self.store is None:
+            return None
+        fetched_at = self.store.fetched_at(key)
+        if fetched_at is None:
+            return None
+        left = ttl - (_utcnow() - fetched_at).total_seconds()
+        return left if left > 0 else None
+
+    def get_or_fetch(self, provider, kind, lat, lon, fetch, ttl, city=None, healthy=None):
+        """
+        Return the cached payload, or call fetch(lat, lon) and cache it.
+        Concurrent misses for the same key share one fetch (single-flight).
+        Failed fetches (None / empty) are returned as-is and never cached.
+
+        If only a stale copy is cached, it is returned (marked stale) when
+        healthy() says the upstream is down, with the refresh moved to the
+        background, or when the refresh fails.
+        """
+        found = self._lookup(make_key(provider, kind, lat, lon), ttl)
+        if found is not None and found[1]:
+            return found[0]
+        stale = found[0] if found is not None else None
+
+        if stale is not None and healthy is not None and not healthy():
+            self._revalidate(provider, kind, lat, lon, fetch, ttl, city)
+            return self._serve_stale(stale)
+
+        value = self.refresh(provider, kind, lat, lon, fetch, ttl, city=city)
+        if not value and stale is not None:
+            return self._serve_stale(stale)
+        return value
+
+    def _serve_stale(self, payload):
+        self.stale_served += 1
+        if isinstance(payload, dict):
+            return dict(payload, **{STALE_KEY: True})
+        return payload
+
+    def _revalidate(self, provider, kind, lat, lon, fetch, ttl, city):
+        """Refresh in the background, at most one job per key at a time."""
+        key = make_key(provider, kind, lat, lon)
+        with self._lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+        self.revalidations += 1
+
+        def job():
+            try:
+                self.refresh(provider, kind, lat, lon, fetch, ttl, city=city)
+            finally:
+                with self._lock:
+                    self._revalidating.discard(key)
+
+        _REVALIDATE_POOL.submit(job)
+
+    def refresh(self, provider, kind, lat, lon, fetch, ttl, city=None):
+        """Fetch from upstream now, skipping the read, and store a good result."""
+        def load():
+            self.fetches += 1
+            fetched = fetch(lat, lon)
+            if not fetched:
+                self.fetch_failures += 1
+                return fetched
+            self.set(provider, kind, lat, lon, fetched, ttl, city=city)
+            return fetched
+
+        try:
+            return self.flight.do(make_key(provider, kind, lat, lon), load,
+                                  timeout=config.SINGLEFLIGHT_WAIT)
+        except FlightTimeout:
+            return None
+
+    def invalidate(self, provider, kind, lat, lon):
+        self.memory.pop(make_key(provider, kind, lat, lon))
+
+    def stats(self) -> dict:
+        return {
+            "memory": self.memory.stats(),
+            "persistent": self.store.stats() if self.store is not None else None,
+            "fetches": self.fetches,
+            "fetch_failures": self.fetch_failures,
+            "stale_served": self.stale_served,
+            "revalidations": self.revalidations,
+            "single_flight": self.flight.stats(),
+        }
+
+
+# Process-wide cache used by services/weather_service.py.
+weather_cache = TwoTierCache(
+    LRUCache(config.CACHE_MAX_ENTRIES, default_ttl=config.FORECAST_CACHE_TTL),
+    PersistentCache(binary=config.CACHE_BINARY_PAYLOADS) if config.CACHE_PERSISTENT else None,
+    compact=config.CACHE_MEMORY_COMPACT,
+    stale_ttl=config.CACHE_STALE_TTL,
+)
@@ -0,0 +1,130 @@
+# services/fanout.py
+# Concurrent fetch stage for the independent upstream calls behind one page.
+# All requests share one bounded thread pool, so a burst of searches can't
+# spawn unbounded threads. Each call has its own timeout, and the whole stage
+# has a per-request deadline.
+#
+# Failure policy:
+# - A required task that fails (raises, returns None/empty, or times out)
+#   stops the stage right away with FanoutError. We don't wait for the others.
+# - An optional task that fails just leaves None in the results.
+#
+# imap_unordered() is the streaming variant for batch work: many similar
+# calls, at most `limit` in flight, results yielded as they finish.
+#
+# Calls run in a copy of the caller's context, so per-request state (the
+# metrics spans) follows them onto the pool.
+
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+
+import config
+
+_POOL = ThreadPoolExecutor(
+    max_workers=config.FANOUT_MAX_WORKERS,
+    thread_name_prefix="upstream",
+)
+
+
+@dataclass
+class Task:
+    name: str
+    fn: callable
+    args: tuple = ()
+    timeout: float = None       # per-provider timeout in seconds (None = deadline only)
+    required: bool = True
+
+
+class FanoutError(Exception):
+    def __init__(self, failures: dict):
+        # name -> short reason ("timeout", "empty", or the exception text)
+        self.failures = failures
+        super().__init__(", ".join(f"{k}: {v}" for k, v in failures.items()))
+
+
+def fetch_all(tasks, deadline=None):
+    """
+    Run every task on the shared pool and merge the results into
+    {task.name: result}. Optional tasks that fail map to None.
+    Raises FanoutError on the first failed required task.
+    """
+    deadline = config.FANOUT_DEADLINE if deadline is None else deadline
+    started = time.monotonic()
+    stage_end = started + deadline
+
+    pending = {}
+    ends = {}
+    for task in tasks:
+        fut = _POOL.submit(contextvars.copy_context().run, task.fn, *task.args)
+        pending[fut] = task
+        limit = deadline if task.timeout is None else min(task.timeout, deadline)
+        ends[task.name] = started + limit
+
+    results = {task.name: None for task in tasks}
+    failures = {}
+
+    def fail(task, reason):
+        failures[task.name] = reason
+        if task.required:
+            for fut in pending:
+                fut.cancel()
+            raise FanoutError(dict(failures))
+
+    while pending:
+        now = time.monotonic()
+        wait_for = max(0.0, min(ends[t.name] for t in pending.values()) - now)
+        done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+        for fut in done:
+            task = pending.pop(fut)
+            try:
+                value = fut.result()
+            except Exception as e:
+                fail(task, str(e) or type(e).__name__)
+                continue
+            if not value:
+                fail(task, "empty")
+                continue
+            results[task.name] = value
+
+        now = time.monotonic()
+        for fut, task in list(pending.items()):
+            if now >= ends[task.name] or now >= stage_end:
+                # The worker thread keeps running until the HTTP timeout,
+                # but nobody waits on it any more.
+                del pending[fut]
+                fut.cancel()
+                fail(task, "timeout")
+
+    return results
+
+
+def imap_unordered(fn, items, limit):
+    """
+    Call fn(item) for every item on the shared pool, keeping at most `limit`
+    calls in flight. Yields (item, result, error) in completion order; error
+    is the exception fn raised, or None.
+    """
+    items = iter(items)
+    running = {}
+
+    def top_up():
+        while len(running) < max(1, limit):
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+            running[_POOL.submit(contextvars.copy_context().run, fn, item)] = item
+
+    top_up()
+    while running:
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for fut in done:
+            item = running.pop(fut)
+            try:
+                yield item, fut.result(), None
+            except Exception as e:
+                yield item, None, e
+        top_up()
@@ -0,0 +1,241 @@
+# services/forecast_codec.py
+# Compact binary encoding for cached Open-Meteo payloads.
+#
+# A forecast is mostly the "hourly"/"daily" sections: 168 ISO timestamps and
+# a few float/int lists. As JSON that is ~10 KB which must be parsed again on
+# every read. Here each list becomes a packed column instead:
+# - regular time axes ("2025-08-22T00:00", +1h, ...) are stored as
+#   start + step + count, with no per-element data
+# - other timestamps (sunrise/sunset) are int64 epoch seconds
+# - all-int lists are int32/int64, all-float lists are float64 (bit-exact)
+# - anything else (None holes, mixed types, strings, units) stays JSON
+#
+# Layout (all little-endian):
+#   b"OMF" | version u8 | header length u32 | header JSON | pad to 8
+#   column data, each column 8-byte aligned
+# The header holds the top-level non-section fields and the column directory
+# [section, name, kind, count, offset, params].
+#
+# decode(blob) gives back a dict equal to the original payload (same keys,
+# order, values and int/float types). EncodedForecast(blob).column(...) returns
+# memoryviews over the blob for callers that want numbers without a copy.
+
+import json
+import struct
+import sys
+from array import array
+from datetime import date, datetime
+
+MAGIC = b"OMF"
+VERSION = 1
+SECTIONS = ("hourly", "daily")
+
+_PREFIX = struct.Struct("<3sBI")
+_EPOCH = datetime(1970, 1, 1)
+_FORMATS = ("%Y-%m-%dT%H:%M", "%Y-%m-%d")
+_CLOCK = tuple(f"{m // 60:02d}:{m % 60:02d}" for m in range(1440))
+_SWAP = sys.byteorder == "big"
+
+
+class CodecError(ValueError):
+    pass
+
+
+# ---- time helpers ----
+def _parse_epochs(values):
+    return [int((datetime.fromisoformat(v) - _EPOCH).total_seconds()) for v in values]
+
+
+def _format_epochs(epochs, fmt):
+    # strftime per element is the slow part of decoding, so build the
+    # strings from a per-day prefix and a minute-of-day table instead.
+    out = []
+    day_cache = {}
+    with_clock = fmt == _FORMATS[0]
+    for e in epochs:
+        day, secs = divmod(e, 86400)
+        prefix = day_cache.get(day)
+        if prefix is None:
+            prefix = day_cache[day] = date.fromordinal(719163 + day).isoformat()
+        out.append(f"{prefix}T{_CLOCK[secs // 60]}" if with_clock else prefix)
+    return out
+
+
+def _as_times(values):
+    """(fmt, epochs) if every value is a timestamp we can rebuild exactly, else None."""
+    if not values or not all(type(v) is str for v in values):
+        return None
+    fmt = {16: _FORMATS[0], 10: _FORMATS[1]}.get(len(values[0]))
+    if fmt is None:
+        return None
+    try:
+        epochs = _parse_epochs(values)
+    except ValueError:
+        return None
+    if _format_epochs(epochs, fmt) != values:
+        return None
+    return fmt, epochs
+
+
+# Locations that share a local date share the same axis, so rebuilt axes are
+# memoized (bounded; cleared when full).
+_AXES = {}
+_AXES_MAX = 256
+
+
+def _axis_strings(fmt, start, step, count):
+    key = (fmt, start, step, count)
+    strings = _AXES.get(key)
+    if strings is None:
+        if len(_AXES) >= _AXES_MAX:
+            _AXES.clear()
+        epochs = range(start, start + step * count, step) if step else [start] * count
+        strings = _AXES[key] = _format_epochs(epochs, fmt)
+    return list(strings)
+
+
+def _int_typecode(values):
+    lo, hi = min(values), max(values)
+    if -2**31 <= lo and hi < 2**31:
+        return "i"
+    if -2**63 <= lo and hi < 2**63:
+        return "q"
+    return None
+
+
+# ---- encode ----
+def _encode_column(values):
+    """(kind, params, data bytes) for one section entry."""
+    if isinstance(values, list) and values:
+        times = _as_times(values)
+        if times is not None:
+            fmt, epochs = times
+            step = epochs[1] - epochs[0] if len(epochs) > 1 else 0
+            if all(b - a == step for a, b in zip(epochs, epochs[1:])):
+                return "axis", [fmt, epochs[0], step], b""
+            return "epoch", [fmt], _pack("q", epochs)
+        if all(type(v) is int for v in values):
+            tc = _int_typecode(values)
+            if tc:
+                return "int", [tc], _pack(tc, values)
+        if all(type(v) is float for v in values):
+            return "float", ["d"], _pack("d", values)
+    return "json", [values], b""
+
+
+def _pack(tc, values):
+    arr = array(tc, values)
+    if _SWAP:
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def encodable(payload) -> bool:
+    return isinstance(payload, dict) and any(isinstance(payload.get(s), dict) for s in SECTIONS)
+
+
+def encode(payload: dict) -> bytes:
+    if not encodable(payload):
+        raise CodecError("payload has no hourly/daily section")
+
+    meta, cols, chunks = {}, [], []
+    keys = list(payload)
+    offset = 0
+    for key in keys:
+        section = payload[key]
+        if key not in SECTIONS or not isinstance(section, dict) or not section:
+            meta[key] = payload[key]
+            continue
+        for name, values in section.items():
+            kind, params, data = _encode_column(values)
+            count = len(values) if kind != "json" else 0
+            cols.append([key, name, kind, count, offset, params])
+            if data:
+                chunks.append(data)
+                pad = -len(data) % 8
+                if pad:
+                    chunks.append(b"\0" * pad)
+                offset += len(data) + pad
+
+    header = json.dumps({"keys": keys, "meta": meta, "cols": cols},
+                        separators=(",", ":"), ensure_ascii=False).encode()
+    start = _PREFIX.size + len(header)
+    start += -start % 8
+    header += b" " * (start - _PREFIX.size - len(header))
+    # Stored offsets are relative to the data region, so the header can be
+    # built before its own length is known.
+    return b"".join([_PREFIX.pack(MAGIC, VERSION, len(header)), header, *chunks])
+
+
+# ---- decode ----
+class EncodedForecast:
+    """Read-only view over an encoded payload. Numeric columns are memoryviews into the blob."""
+
+    def __init__(self, blob):
+        view = memoryview(blob)
+        if len(view) < _PREFIX.size:
+            raise CodecError("truncated payload")
+        magic, version, header_len = _PREFIX.unpack_from(view)
+        if magic != MAGIC:
+            raise CodecError("not an encoded forecast")
+        if version != VERSION:
+            raise CodecError(f"unsupported codec version {version}")
+        data_start = _PREFIX.size + header_len
+        header = json.loads(bytes(view[_PREFIX.size:data_start]))
+        self.view = view
+        self.keys = header["keys"]
+        self.meta = header["meta"]
+        self.data_start = data_start
+        self.columns = {}
+        for section, name, kind, count, offset, params in header["cols"]:
+            self.columns.setdefault(section, {})[name] = (kind, count, offset, params)
+
+    def _raw(self, kind, count, offset, params):
+        tc = "q" if kind == "epoch" else params[0]
+        size = array(tc).itemsize
+        start = self.data_start + offset
+        raw = self.view[start:start + count * size]
+        if _SWAP:
+            arr = array(tc, raw.tobytes())
+            arr.byteswap()
+            return memoryview(arr)
+        return raw.cast(tc)
+
+    def column(self, section, name):
+        """
+        memoryview for int/float/epoch columns (no copy), (fmt, start, step, count)
+        for a regular time axis, or the stored value for JSON columns.
+        """
+        kind, count, offset, params = self.columns[section][name]
+        if kind == "axis":
+            fmt, start, step = params
+            return fmt, start, step, count
+        if kind == "json":
+            return params[0]
+        return self._raw(kind, count, offset, params)
+
+    def values(self, section, name):
+        """The column as the original Python list."""
+        kind, count, offset, params = self.columns[section][name]
+        if kind == "axis":
+            fmt, start, step = params
+            return _axis_strings(fmt, start, step, count)
+        if kind == "json":
+            return params[0]
+        raw = self._raw(kind, count, offset, params)
+        if kind == "epoch":
+            return _format_epochs(raw.tolist(), params[0])
+        return raw.tolist()
+
+    def to_dict(self) -> dict:
+        out = {}
+        for key in self.keys:
+            if key in self.columns:
+                out[key] = {name: self.values(key, name) for name in self.columns[key]}
+            else:
+                out[key] = self.meta[key]
+        return out
+
+
+def decode(blob) -> dict:
+    return EncodedForecast(blob).to_dict()
@@ -0,0 +1,200 @@
+# services/forecast_frame.py
+# Columnar view of one Open-Meteo forecast payload.
+# The frame is built once per payload and replaces the per-element loops in
+# the old humidity averaging / organize_weekly_forecast /
+# hourly_forcast_list_f / current_hour_description:
+# - the hourly time axis is kept as start + step (epoch seconds), so finding
+#   the current hour is arithmetic instead of times.index() or a strptime
+#   over every timestamp
+# - temperatures and humidity are NumPy columns, so unit conversion and
+#   daily means are vectorized
+#
+# The output matches the old functions exactly (same floats, same strings):
+# conversions keep the same operation order, and rounding/formatting still
+# happen on Python floats. benchmarks/bench_forecast_frame.py checks this and
+# times both versions.
+#
+# NEEDS declares which fields (and how much of the forecast) each transform
+# reads; services/weather_service.py builds its query profiles from it. Fields
+# a profile leaves out are simply absent, so only call what it covers.
+
+from datetime import date, datetime
+
+import numpy as np
+
+import config
+from services.forecast_query import needs
+
+_EPOCH = datetime(1970, 1, 1)
+_DAY_NAMES = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+
+def _epoch(ts: str) -> int:
+    # Open-Meteo local timestamps ("2025-08-22T05:00"), treated as naive.
+    return int((datetime.fromisoformat(ts) - _EPOCH).total_seconds())
+
+
+def _hour_label(hh: int, mm: int) -> str:
+    if hh == 0:
+        return f"12:{mm:02d} AM"
+    if hh < 12:
+        return f"{hh}:{mm:02d} AM"
+    if hh == 12:
+        return f"12:{mm:02d} PM"
+    return f"{hh - 12}:{mm:02d} PM"
+
+
+_HOUR_LABELS = {f"{h:02d}:00": _hour_label(h, 0) for h in range(24)}
+
+
+def _day_suffix(n: int) -> str:
+    if 11 <= n % 100 <= 13:
+        return "th"
+    return {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+
+
+NEEDS = {
+    "current_description": needs(hourly={"weathercode"}, hours=1),
+    "daily_humidity_means": needs(hourly={"relative_humidity_2m"}, days=7, hourly_days=True),
+    "hourly_window": needs(hourly={"temperature_2m", "weathercode"}, hours=24),
+    "weekly": needs(daily={"temperature_2m_max", "temperature_2m_min", "weathercode"}, days=7),
+    "weekly_rain": needs(daily={"precipitation_probability_max"}, days=7),
+}
+
+
+class ForecastFrame:
+    def __init__(self, data: dict):
+        hourly = data["hourly"]
+        daily = data["daily"]
+
+        # ---- hourly axis ----
+        self.times = hourly["time"]
+        self.n_hours = len(self.times)
+        self.start = _epoch(self.times[0]) if self.n_hours else 0
+        self.step = 3600
+        self.regular = True
+        if self.n_hours > 1:
+            self.step = _epoch(self.times[1]) - self.start
+            last = _epoch(self.times[-1])
+            self.regular = self.step > 0 and last == self.start + (self.n_hours - 1) * self.step
+        # Only needed when the axis has gaps (never seen from Open-Meteo).
+        self.epochs = None if self.regular else np.array([_epoch(t) for t in self.times], dtype=np.int64)
+
+        self.temp = np.asarray(hourly.get("temperature_2m", ()), dtype=np.float64)
+        self.humidity = np.asarray(hourly.get("relative_humidity_2m", ()), dtype=np.float64)
+        self.hourly_codes = hourly["weathercode"]
+
+        # ---- daily columns (raw lists are kept so °C values keep their type) ----
+        self.days = daily["time"]
+        self.tmax_raw = daily["temperature_2m_max"]
+        self.tmin_raw = daily["temperature_2m_min"]
+        self.tmax = np.asarray(self.tmax_raw, dtype=np.float64)
+        self.tmin = np.asarray(self.tmin_raw, dtype=np.float64)
+        self.rain_chance = daily.get("precipitation_probability_max")
+        self.daily_codes = daily["weathercode"]
+
+    # ---- time lookups ----
+    @staticmethod
+    def _hour_epoch(now_local) -> int:
+        # Same instant the old code built with strftime("%Y-%m-%dT%H:00").
+        naive = datetime(now_local.year, now_local.month, now_local.day, now_local.hour)
+        return int((naive - _EPOCH).total_seconds())
+
+    def hour_index(self, now_local):
+        """Index of the current local hour on the axis, or None if it isn't there."""
+        if not self.n_hours:
+            return None
+        target = self._hour_epoch(now_local)
+        if self.regular:
+            offset = target - self.start
+            if offset % self.step:
+                return None
+            idx = offset // self.step
+            return idx if 0 <= idx < self.n_hours else None
+        idx = int(np.searchsorted(self.epochs, target))
+        return idx if idx < self.n_hours and self.epochs[idx] == target else None
+
+    def nearest_hour_index(self, now_local) -> int:
+        """Closest hour to now (earlier index wins a tie, like min() did)."""
+        exact = self.hour_index(now_local)
+        if exact is not None:
+            return exact
+        target = self._hour_epoch(now_local)
+        if self.regular:
+            pos = (target - self.start) / self.step
+            lo = int(np.floor(pos))
+            idx = lo if (pos - lo) <= (lo + 1 - pos) else lo + 1
+            return min(max(idx, 0), self.n_hours - 1)
+        diffs = np.abs(self.epochs - target)
+        return int(np.argmin(diffs))
+
+    # ---- transforms ----
+    def current_description(self, now_local) -> str:
+        code = self.hourly_codes[self.nearest_hour_index(now_local)]
+        return config.WEATHERCODE_MAP.get(code, "Unknown")
+
+    def daily_humidity_means(self):
+        """Mean humidity per 24h block, rounded to 2 places."""
+        n_days = len(self.humidity) // 24
+        if not n_days:
+            return []
+        blocks = self.humidity[: n_days * 24].reshape(n_days, 24)
+        # cumsum adds left to right like sum() did (np.sum uses pairwise
+        # summation, which can differ in the last bit).
+        totals = np.cumsum(blocks, axis=1)[:, -1] / 24
+        return [round(t, 2) for t in totals.tolist()]
+
+    def _format_temps(self, celsius, temp_type):
+        t = (temp_type or "c").lower()
+        kelvin = celsius + 273.15
+        if t == "c":
+            return [f"{v:.2f}°C" for v in (kelvin - 273.15).tolist()]
+        if t == "f":
+            return [f"{v:.2f}°F" for v in ((kelvin - 273.15) * 9 / 5 + 32).tolist()]
+        return ["Invalid temperature type"] * len(celsius)
+
+    def hourly_window(self, now_local, temp_type, num_hours=24):
+        """
+        The next num_hours entries starting at the current hour (or at 0 if
+        it's missing); fewer if the axis ends first.
+        """
+        if not self.n_hours:
+            return []
+        start = self.hour_index(now_local) or 0
+        idx = np.arange(start, min(start + num_hours, self.n_hours))
+        temps = self._format_temps(self.temp[idx], temp_type)
+
+        out = []
+        for i, temp in zip(idx.tolist(), temps):
+            t = self.times[i]
+            clock = t[11:16]
+            label = _HOUR_LABELS.get(clock) or _hour_label(int(clock[:2]), int(clock[3:5]))
+            out.append({
+                "display_hour": label,
+                "temp": temp,
+                "date": t[:10],
+                "desc": config.WEATHERCODE_MAP.get(self.hourly_codes[i], "Unknown"),
+            })
+        return out
+
+    def weekly(self, temp_type):
+        if (temp_type or "c").lower() == "f":
+            tmax = [round(v, 1) for v in (self.tmax * 9 / 5 + 32).tolist()]
+            tmin = [round(v, 1) for v in (self.tmin * 9 / 5 + 32).tolist()]
+        else:
+            tmax, tmin = self.tmax_raw, self.tmin_raw
+
+        forecast = []
+        for i, d in enumerate(self.days):
+            y, m, day_num = int(d[:4]), int(d[5:7]), int(d[8:10])
+            day_name = _DAY_NAMES[date(y, m, day_num).weekday()]
+            month = config.MONTH_NAME_MAP[d[5:7]]
+            forecast.append({
+                "day": day_name,
+                "month_day_full": f"{day_name}, {month} {day_num}{_day_suffix(day_num)}",
+                "temperature_2m_max": tmax[i],
+                "temperature_2m_min": tmin[i],
+                "rain": self.rain_chance[i] if self.rain_chance is not None else None,
+                "weathercode": self.daily_codes[i],
+            })
+        return forecast
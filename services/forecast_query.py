@@ -0,0 +1,85 @@
+# services/forecast_query.py
+# Builds Open-Meteo forecast queries from what the caller will render.
+#
+# Each transform declares the fields and window it reads as a Needs (see
+# NEEDS in services/forecast_frame.py). A profile is the union of the needs of
+# everything one view renders, turned into a ForecastQuery: only those hourly
+# and daily fields, only as many days as the longest daily list, and, when
+# nothing needs whole days of hourly data, only the next few hours
+# (forecast_hours) instead of 7 x 24.
+#
+# Profiles live in services/weather_service.py (FORECAST_PROFILES). Payloads
+# are cached per profile, so "page" and "summary" never share an entry.
+
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlencode
+
+import config
+
+
+@dataclass(frozen=True)
+class Needs:
+    hourly: frozenset = frozenset()
+    daily: frozenset = frozenset()
+    days: int = 0              # daily rows, starting today
+    hours: int = 0             # hourly rows, starting at the current hour
+    hourly_days: bool = False  # hourly rows must cover whole days (e.g. daily means)
+
+    def __or__(self, other: "Needs") -> "Needs":
+        return Needs(
+            hourly=self.hourly | other.hourly,
+            daily=self.daily | other.daily,
+            days=max(self.days, other.days),
+            hours=max(self.hours, other.hours),
+            hourly_days=self.hourly_days or other.hourly_days,
+        )
+
+
+def needs(hourly=(), daily=(), days=0, hours=0, hourly_days=False) -> Needs:
+    return Needs(frozenset(hourly), frozenset(daily), days, hours, hourly_days)
+
+
+@dataclass(frozen=True)
+class ForecastQuery:
+    profile: str
+    hourly: tuple
+    daily: tuple
+    forecast_days: int
+    forecast_hours: Optional[int] = None
+
+    def params(self, lat, lon) -> dict:
+        params = {"latitude": lat, "longitude": lon}
+        if self.daily:
+            params["daily"] = ",".join(self.daily)
+        if self.hourly:
+            params["hourly"] = ",".join(self.hourly)
+        params["forecast_days"] = self.forecast_days
+        if self.forecast_hours is not None:
+            params["forecast_hours"] = self.forecast_hours
+        params["timezone"] = "auto"
+        return params
+
+    def url(self, lat, lon, base_url=None) -> str:
+        # Commas are left as-is, like the hand-written URL this replaces.
+        base = base_url or config.OPEN_METEO_FORECAST_URL
+        return f"{base}?{urlencode(self.params(lat, lon), safe=',')}"
+
+
+def build_query(profile: str, need: Needs) -> ForecastQuery:
+    """Smallest query that satisfies `need`."""
+    hours = need.hours if need.hourly and not need.hourly_days else 0
+    days = max(need.days, 1)
+    forecast_hours = None
+    if hours:
+        # The axis starts at the hour the payload was fetched, and a cached
+        # (or stale) payload is read for up to FORECAST_HOURS_SLACK hours after.
+        forecast_hours = hours + config.FORECAST_HOURS_SLACK
+        days = max(days, -(-forecast_hours // 24) + 1)
+    return ForecastQuery(
+        profile=profile,
+        hourly=tuple(sorted(need.hourly)),
+        daily=tuple(sorted(need.daily)),
+        forecast_days=days,
+        forecast_hours=forecast_hours,
+    )
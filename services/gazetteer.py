@@ -0,0 +1,228 @@
+# services/gazetteer.py
+# Optional offline gazetteer for city search.
+# It loads a GeoNames-style cities file (e.g. cities15000.txt, plus
+# admin1CodesASCII.txt for state names) and keeps a trigram index over
+# normalized city names, so a city (+ optional country) resolves locally,
+# typos included. search_locations only falls back to the live OWM geocoder
+# when the index has nothing.
+#
+# Build the index once, then point GAZETTEER_PATH at the .idx file:
+#   python -m services.gazetteer build cities15000.txt -o gazetteer.idx
+# GAZETTEER_PATH may also point straight at the .txt file; the index is then
+# built at startup.
+
+import difflib
+import heapq
+import os
+import pickle
+import sys
+from array import array
+from collections import Counter, defaultdict
+from itertools import chain
+
+import config
+
+INDEX_VERSION = 1
+
+# How many trigram candidates get re-scored with difflib (the expensive part).
+RERANK_POOL = 12
+
+
+def normalize_name(s: str) -> str:
+    # Same normalization as newestclean._normalize_city.
+    return "".join((s or "").lower().split())
+
+
+def trigrams(norm: str):
+    padded = f"  {norm} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _read_admin1(path):
+    # admin1CodesASCII.txt rows look like "US.CA<TAB>California<TAB>California<TAB>5332921"
+    names = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) >= 2:
+                names[parts[0]] = parts[1]
+    return names
+
+
+class Gazetteer:
+    """
+    Column-oriented city table plus two indexes:
+    - exact: normalized name -> row ids, for O(1) exact hits
+    - grams: trigram -> array of row ids, for fuzzy candidates
+    """
+
+    def __init__(self):
+        self.names = []
+        self.states = []
+        self.countries = []
+        self.lats = array("d")
+        self.lons = array("d")
+        self.population = array("q")
+        self.norm_lengths = array("H")
+        self.exact = {}
+        self.grams = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    # ---- Building ----
+    @classmethod
+    def from_geonames(cls, cities_path, admin1_path=None):
+        """
+        Build from a GeoNames dump (tab separated, 19 columns).
+        If admin1_path is None we look for admin1CodesASCII.txt next to the file.
+        """
+        if admin1_path is None:
+            guess = os.path.join(os.path.dirname(cities_path), "admin1CodesASCII.txt")
+            admin1_path = guess if os.path.exists(guess) else None
+        admin1 = _read_admin1(admin1_path) if admin1_path else {}
+
+        g = cls()
+        exact = defaultdict(list)
+        grams = defaultdict(list)
+        with open(cities_path, encoding="utf-8") as f:
+            for line in f:
+                cols = line.rstrip("\n").split("\t")
+                if len(cols) < 15:
+                    continue
+                try:
+                    lat, lon = float(cols[4]), float(cols[5])
+                    pop = int(cols[14] or 0)
+                except ValueError:
+                    continue
+                name, ascii_name, country = cols[1], cols[2], cols[8]
+                rid = len(g.names)
+                g.names.append(name)
+                g.states.append(admin1.get(f"{country}.{cols[10]}", ""))
+                g.countries.append(country)
+                g.lats.append(lat)
+                g.lons.append(lon)
+                g.population.append(pop)
+
+                keys = {normalize_name(name), normalize_name(ascii_name)} - {""}
+                g.norm_lengths.append(min(len(k) for k in keys) if keys else 0)
+                for key in keys:
+                    exact[key].append(rid)
+                    for gram in trigrams(key):
+                        grams[gram].append(rid)
+
+        g.exact = {k: array("I", v) for k, v in exact.items()}
+        g.grams = {k: array("I", sorted(set(v))) for k, v in grams.items()}
+        return g
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            pickle.dump((INDEX_VERSION, self.__dict__), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            version, state = pickle.load(f)
+        if version != INDEX_VERSION:
+            raise ValueError(f"Gazetteer index {path} is version {version}, expected {INDEX_VERSION}. Rebuild it.")
+        g = cls()
+        g.__dict__.update(state)
+        return g
+
+    # ---- Lookup ----
+    def _row(self, rid):
+        # Same dict shape as newestclean._owm_fetch returns.
+        return {
+            "name": self.names[rid],
+            "state": self.states[rid],
+            "country": self.countries[rid],
+            "lat": self.lats[rid],
+            "lon": self.lons[rid],
+        }
+
+    def lookup(self, city, country=None, limit=7, exact_only=False):
+        """
+        Return up to `limit` candidates for city (+ optional ISO country code).
+        Exact name matches win and are ordered by population. Otherwise trigram
+        candidates are re-scored with the same difflib ratio, US-state bonus and
+        thresholds that search_locations uses for its live fallback.
+        """
+        target = normalize_name(city)
+        if len(target) < 2:
+            return []
+        country = (country or "").strip().upper()
+
+        def in_country(rid):
+            return not country or self.countries[rid] == country
+
+        hits = [rid for rid in self.exact.get(target, ()) if in_country(rid)]
+        if hits:
+            hits.sort(key=lambda rid: self.population[rid], reverse=True)
+            return [self._row(rid) for rid in hits[:limit]]
+        if exact_only:
+            return []
+
+        query_grams = trigrams(target)
+        counts = Counter(chain.from_iterable(self.grams.get(gram, ()) for gram in query_grams))
+        if not counts:
+            return []
+
+        # Names sharing under a third of the query's trigrams can't get near
+        # the difflib threshold, so drop them before the scoring below.
+        n_query = len(query_grams)
+        min_shared = max(2, n_query // 3) if n_query > 3 else 1
+        candidates = [rid for rid, n in counts.items() if n >= min_shared and in_country(rid)]
+
+        # Dice coefficient on trigram sets (a name of length n has about
+        # n + 1 padded trigrams), population as a tie breaker.
+        pool = heapq.nlargest(
+            RERANK_POOL,
+            candidates,
+            key=lambda rid: (2 * counts[rid] / (n_query + self.norm_lengths[rid] + 1), self.population[rid]),
+        )
+        if not pool:
+            return []
+
+        scored = []
+        seen = set()
+        for rid in pool:
+            key = (self.names[rid], self.states[rid], self.countries[rid])
+            if key in seen:
+                continue
+            seen.add(key)
+            sim = difflib.SequenceMatcher(None, target, normalize_name(self.names[rid])).ratio()
+            bonus = 0.02 if (self.countries[rid] == "US" and self.states[rid]) else 0.0
+            scored.append((sim + bonus, sim, self.population[rid], rid))
+        scored.sort(key=lambda t: (t[0], t[2]), reverse=True)
+
+        best_sim = scored[0][1]
+        if best_sim < config.FUZZY_BEST_SIM_THRESHOLD:
+            return []
+        return [
+            self._row(rid)
+            for _total, sim, _pop, rid in scored
+            if sim >= best_sim - config.FUZZY_CLOSE_MARGIN
+        ][:limit]
+
+
+def load_configured():
+    """Load the gazetteer named by GAZETTEER_PATH, or None when unset."""
+    path = config.GAZETTEER_PATH
+    if not path:
+        return None
+    if path.endswith(".txt"):
+        return Gazetteer.from_geonames(path)
+    return Gazetteer.load(path)
+
+
+if __name__ == "__main__":
+    # python -m services.gazetteer build cities15000.txt [-o gazetteer.idx] [--admin1 admin1CodesASCII.txt]
+    args = sys.argv[1:]
+    if len(args) < 2 or args[0] != "build":
+        sys.exit("usage: python -m services.gazetteer build CITIES.txt [-o OUT.idx] [--admin1 ADMIN1.txt]")
+    src = args[1]
+    out = args[args.index("-o") + 1] if "-o" in args else os.path.splitext(src)[0] + ".idx"
+    admin1 = args[args.index("--admin1") + 1] if "--admin1" in args else None
+    gaz = Gazetteer.from_geonames(src, admin1)
+    gaz.save(out)
+    print(f"Indexed {len(gaz)} places, {len(gaz.grams)} trigrams -> {out}")
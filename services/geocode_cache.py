@@ -0,0 +1,162 @@
+# services/geocode_cache.py
+# Cache for OpenWeatherMap geocoding lookups (search_locations / get_coordinates).
+# - Keyed by the normalized query string + country code.
+# - Same two tiers as services/cache.py: an in-process LRU in front of the
+#   geocode_cache table, so results survive restarts.
+# - "No results" answers are cached too, with a shorter TTL, so a mistyped
+#   query (and the broadening terms it triggers) costs no round trips the
+#   second time.
+# - purge_expired() drops rows past their TTL (run by services/retention.py).
+
+from datetime import timedelta
+
+from sqlalchemy import select, delete
+from sqlalchemy.exc import SQLAlchemyError
+
+import config
+from models_core import new_session, GeocodeCache
+from services.cache import LRUCache, _utcnow
+from services.singleflight import geocode_flight
+
+
+def normalize_query(q: str) -> str:
+    return " ".join((q or "").lower().split())
+
+
+def normalize_country(country: str) -> str:
+    return (country or "").strip().upper()
+
+
+def _ttl_for(results) -> float:
+    return config.GEOCODE_CACHE_TTL if results else config.GEOCODE_NEGATIVE_TTL
+
+
+class GeocodeResultCache:
+    def __init__(self, persistent: bool = True):
+        self.memory = LRUCache(config.GEOCODE_CACHE_MAX_ENTRIES, default_ttl=config.GEOCODE_CACHE_TTL)
+        self.persistent = persistent
+        self.fetches = 0
+        self.negative_hits = 0
+        self.store_errors = 0
+
+    def _load(self, key):
+        query, country = key
+        db = new_session()
+        try:
+            row = db.execute(
+                select(GeocodeCache.result_limit, GeocodeCache.results, GeocodeCache.fetched_at)
+                .where(GeocodeCache.query == query, GeocodeCache.country == country)
+            ).first()
+        except SQLAlchemyError:
+            self.store_errors += 1
+            return None
+        finally:
+            db.close()
+        if row is None:
+            return None
+        remaining = _ttl_for(row.results) - (_utcnow() - row.fetched_at).total_seconds()
+        if remaining <= 0:
+            return None
+        return (row.result_limit, row.results), remaining
+
+    def _store(self, key, limit: int, results: list):
+        query, country = key
+        db = new_session()
+        try:
+            row = db.execute(
+                select(GeocodeCache)
+                .where(GeocodeCache.query == query, GeocodeCache.country == country)
+            ).scalar_one_or_none()
+            if row is None:
+                db.add(GeocodeCache(
+                    query=query, country=country, result_limit=limit,
+                    results=results, fetched_at=_utcnow(),
+                ))
+            else:
+                row.result_limit = limit
+                row.results = results
+                row.fetched_at = _utcnow()
+            db.commit()
+        except SQLAlchemyError:
+            db.rollback()
+            self.store_errors += 1
+        finally:
+            db.close()
+
+    def lookup(self, query: str, country: str, limit: int, fetch):
+        """
+        Return up to `limit` geocoding results for query/country.
+        fetch(query, country, limit) is only called on a miss, or when the cached
+        entry was fetched with a smaller limit than this caller wants. Request
+        errors from fetch propagate (to every coalesced caller) and are not cached.
+        """
+        key = (normalize_query(query), normalize_country(country))
+
+        entry = self.memory.get(key)
+        if entry is None and self.persistent:
+            loaded = self._load(key)
+            if loaded is not None:
+                entry, remaining = loaded
+                self.memory.set(key, entry, ttl=remaining)
+
+        if entry is not None:
+            cached_limit, results = entry
+            # An empty answer stays empty for any limit; a short list only
+            # answers callers that asked for no more than we fetched.
+            if not results:
+                self.negative_hits += 1
+                return []
+            if cached_limit >= limit:
+                return results[:limit]
+
+        def load():
+            self.fetches += 1
+            fetched = fetch(query, country, limit)
+            self.memory.set(key, (limit, fetched), ttl=_ttl_for(fetched))
+            if self.persistent:
+                self._store(key, limit, fetched)
+            return fetched
+
+        # Identical lookups running right now share one request; a waiter
+        # that times out gets FlightTimeout.
+        return geocode_flight.do((key, limit), load, timeout=config.SINGLEFLIGHT_WAIT)
+
+    def purge_expired(self, batch_size: int = 500) -> int:
+        """Delete rows past their TTL. Returns the number removed."""
+        now = _utcnow()
+        db = new_session()
+        try:
+            removed = db.execute(delete(GeocodeCache).where(
+                GeocodeCache.fetched_at < now - timedelta(seconds=config.GEOCODE_CACHE_TTL)
+            )).rowcount or 0
+            # "No results" rows expire sooner. JSON can't be compared the same
+            # way on every database, so they are picked out here.
+            rows = db.execute(
+                select(GeocodeCache.id, GeocodeCache.results)
+                .where(GeocodeCache.fetched_at < now - timedelta(seconds=config.GEOCODE_NEGATIVE_TTL))
+            ).all()
+            empty = [r.id for r in rows if not r.results]
+            for i in range(0, len(empty), batch_size):
+                removed += db.execute(
+                    delete(GeocodeCache).where(GeocodeCache.id.in_(empty[i:i + batch_size]))
+                ).rowcount or 0
+            db.commit()
+            return removed
+        except SQLAlchemyError:
+            db.rollback()
+            self.store_errors += 1
+            return 0
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        return {
+            "memory": self.memory.stats(),
+            "fetches": self.fetches,
+            "negative_hits": self.negative_hits,
+            "store_errors": self.store_errors,
+            "single_flight": geocode_flight.stats(),
+        }
+
+
+geocode_cache = GeocodeResultCache(persistent=config.CACHE_PERSISTENT)
@@ -0,0 +1,105 @@
+# services/identity_cache.py
+# Cache for Flask-Login's user_loader.
+# load_user runs on every request from a logged-in user, but pages only need
+# the id (and sometimes the email). We keep a small detached record per user
+# in an LRU with a TTL, so most authenticated page views never touch the
+# database.
+#
+# Invalidation:
+# - any ORM insert/update/delete of a User row (signup, password change, ...)
+#   drops the entry once its transaction commits (mapper events collect the
+#   ids at flush, the session's after_commit drops them); until then other
+#   requests still see, and may cache, the committed row. A rollback drops
+#   nothing.
+# - code that changes users without the ORM should call invalidate(user_id)
+# Other gunicorn workers notice a change within IDENTITY_CACHE_TTL.
+
+from datetime import datetime
+
+from flask_login import UserMixin
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+
+import config
+from models_core import new_session, User
+from services.cache import LRUCache
+
+
+class CachedUser(UserMixin):
+    """Detached, read-only stand-in for models_core.User."""
+
+    __slots__ = ("id", "email", "created_at")
+
+    def __init__(self, id: int, email: str, created_at: datetime):
+        self.id = id
+        self.email = email
+        self.created_at = created_at
+
+    def __repr__(self):
+        return f"<CachedUser {self.id} {self.email}>"
+
+
+class IdentityCache:
+    def __init__(self, max_entries: int, ttl: float):
+        self.users = LRUCache(max_entries, default_ttl=ttl)
+        self.loads = 0
+        self.invalidations = 0
+        # Bumped by every invalidate(); a load that overlapped one doesn't
+        # cache what it read, since that may be the row from before the commit.
+        self._epoch = 0
+
+    def get(self, user_id: int):
+        """Return a CachedUser for user_id, or None if no such user."""
+        cached = self.users.get(user_id)
+        if cached is not None:
+            return cached
+        self.loads += 1
+        epoch = self._epoch
+        db = new_session()
+        try:
+            row = db.execute(
+                select(User.id, User.email, User.created_at).where(User.id == user_id)
+            ).first()
+        finally:
+            db.close()
+        if row is None:
+            return None
+        user = CachedUser(row.id, row.email, row.created_at)
+        if epoch == self._epoch:
+            self.users.set(user_id, user)
+        return user
+
+    def invalidate(self, user_id):
+        if user_id is None:
+            return
+        self.invalidations += 1
+        self._epoch += 1
+        self.users.pop(int(user_id))
+
+    def stats(self) -> dict:
+        return dict(self.users.stats(), loads=self.loads, invalidations=self.invalidations)
+
+
+identity_cache = IdentityCache(config.IDENTITY_CACHE_MAX_ENTRIES, config.IDENTITY_CACHE_TTL)
+
+
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _note_changed_user(_mapper, _conn, target):
+    session = object_session(target)
+    if session is None:
+        identity_cache.invalidate(target.id)
+    else:
+        session.info.setdefault("changed_user_ids", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _drop_changed_users(session):
+    for user_id in session.info.pop("changed_user_ids", ()):
+        identity_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session):
+    session.info.pop("changed_user_ids", None)
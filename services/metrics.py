@@ -0,0 +1,188 @@
+# services/metrics.py
+# Per-stage latency spans, Server-Timing headers and Prometheus metrics.
+#
+# span("forecast") times a block of work and feeds the weather_stage_seconds
+# histogram. Spans that run while serving a request (including on the fan-out
+# pool, which carries the request's context) are also listed in that
+# response's Server-Timing header, so browser dev tools show where the time
+# went.
+#
+# /metrics renders the histograms and counters defined here, plus the
+# counters the caches, provider chains and search recorder already keep
+# (read from their stats() at scrape time), in the Prometheus text format.
+# Numbers are per worker process.
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from flask import Response, g, request
+
+import config
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_REGISTRY = []
+_COLLECTORS = []
+# The current request's [(stage, seconds)], None outside a request.
+_spans = contextvars.ContextVar("metrics_spans", default=None)
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.values = {}
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[n] for n in self.labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            yield f"{self.name}{_labels(self.labels, key)} {value}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}   # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def observe(self, seconds: float, **labels):
+        key = tuple(labels[n] for n in self.labels)
+        with self._lock:
+            row = self.values.get(key)
+            if row is None:
+                row = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    row[i] += 1
+            row[-2] += 1
+            row[-1] += seconds
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self.values.items())
+        for key, row in items:
+            for bound, count in zip(self.buckets + ("+Inf",), row):
+                le = _labels(self.labels + ("le",), key + (bound,))
+                yield f"{self.name}_bucket{le} {count}"
+            yield f"{self.name}_sum{_labels(self.labels, key)} {row[-1]:.6f}"
+            yield f"{self.name}_count{_labels(self.labels, key)} {row[-2]}"
+
+
+STAGE_SECONDS = Histogram("weather_stage_seconds", "Time spent in one stage of serving a page.", ["stage"])
+REQUEST_SECONDS = Histogram("weather_request_seconds", "Whole request time.", ["endpoint", "status"])
+UPSTREAM_RESPONSES = Counter("weather_upstream_responses_total", "Upstream HTTP responses by status code.",
+                             ["host", "code"])
+
+
+@contextmanager
+def span(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        spans = _spans.get()
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+
+def count_response(resp, *_args, **_kwargs):
+    """requests response hook: count the status code per upstream host."""
+    UPSTREAM_RESPONSES.inc(host=urlsplit(resp.url).hostname or "unknown", code=resp.status_code)
+    return resp
+
+
+def collector(fn):
+    """
+    Register fn() -> iterable of (name, type, help, [(labels dict, value)]),
+    called on every scrape.
+    """
+    _COLLECTORS.append(fn)
+    return fn
+
+
+def _render_collected():
+    for fn in _COLLECTORS:
+        for name, kind, help, samples in fn():
+            yield f"# HELP {name} {help}"
+            yield f"# TYPE {name} {kind}"
+            for labels, value in samples:
+                yield f"{name}{_labels(tuple(labels), tuple(labels.values()))} {value}"
+
+
+def render() -> str:
+    lines = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(_render_collected())
+    return "\n".join(lines) + "\n"
+
+
+def server_timing(spans, total: float) -> str:
+    """'geocode;dur=12.3, forecast;dur=40.1, total;dur=55.0' (repeated stages summed)."""
+    merged = {}
+    for stage, seconds in spans:
+        merged[stage] = merged.get(stage, 0.0) + seconds
+    parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in merged.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def init_app(app) -> None:
+    @app.before_request
+    def _start_spans():
+        g._metrics_started = time.perf_counter()
+        g._metrics_spans = []
+        g._metrics_token = _spans.set(g._metrics_spans)
+
+    @app.after_request
+    def _finish_spans(resp):
+        started = g.pop("_metrics_started", None)
+        if started is None:
+            return resp
+        total = time.perf_counter() - started
+        REQUEST_SECONDS.observe(total, endpoint=request.endpoint or "unmatched",
+                                status=f"{resp.status_code // 100}xx")
+        if config.SERVER_TIMING and request.endpoint != "metrics":
+            resp.headers["Server-Timing"] = server_timing(list(g._metrics_spans), total)
+        return resp
+
+    @app.teardown_request
+    def _reset_spans(_exc=None):
+        token = g.pop("_metrics_token", None)
+        if token is not None:
+            _spans.reset(token)
+
+    @app.route("/metrics")
+    def metrics():
+        if config.METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {config.METRICS_TOKEN}":
+            return Response("unauthorized\n", status=401, mimetype="text/plain")
+        return Response(render(), mimetype="text/plain; version=0.0.4")
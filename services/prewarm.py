@@ -0,0 +1,193 @@
+# services/prewarm.py
+# Background cache pre-warmer.
+# It ranks the most-searched locations from recent SearchEvent rows and
+# refreshes their cached payloads shortly before they expire, so nearly every
+# popular search is a cache hit.
+#
+# Controls (config.py):
+# - PREWARM_ENABLED: master switch.
+# - PREWARM_PAUSE_FILE: if this file exists, the loop idles (runtime kill
+#   switch, no restart needed).
+# - PREWARM_BUDGET_PER_MIN: upstream requests per minute (token bucket).
+# - PREWARM_JITTER: random spread in seconds, so a batch of hot entries
+#   doesn't all expire and refresh in the same instant.
+#
+# Run it as its own process (recommended with several gunicorn workers):
+#   python -m services.prewarm
+# or in-process with PREWARM_IN_PROCESS=1 (a daemon thread per worker).
+
+import logging
+import os
+import random
+import signal
+import threading
+import time
+from datetime import timedelta
+
+from sqlalchemy import select, func
+
+import config
+from models_core import new_session, SearchEvent
+from services.cache import weather_cache, normalize_coord, _utcnow
+from services.weather_service import CACHED_PAYLOADS
+
+log = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Allows `per_minute` takes per minute, with bursts up to that size."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = max(1.0, float(per_minute))
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+def hot_locations(window_hours: float, top_n: int):
+    """
+    Most searched locations in the last window_hours, busiest first, as
+    [(lat, lon, city, searches)]. Searches are grouped by rounded coordinates,
+    the same way the cache keys them.
+    """
+    since = _utcnow() - timedelta(hours=window_hours)
+    digits = config.CACHE_COORD_DECIMALS
+    rlat = func.round(SearchEvent.lat, digits)
+    rlon = func.round(SearchEvent.lon, digits)
+    db = new_session()
+    try:
+        rows = db.execute(
+            select(rlat, rlon, func.max(SearchEvent.city), func.count(SearchEvent.id))
+            .where(
+                SearchEvent.created_at >= since,
+                SearchEvent.lat.is_not(None),
+                SearchEvent.lon.is_not(None),
+            )
+            .group_by(rlat, rlon)
+            .order_by(func.count(SearchEvent.id).desc())
+            .limit(top_n)
+        ).all()
+    finally:
+        db.close()
+    return [(normalize_coord(lat), normalize_coord(lon), city, n) for lat, lon, city, n in rows]
+
+
+class Prewarmer:
+    def __init__(self, cache=weather_cache, payloads=CACHED_PAYLOADS):
+        self.cache = cache
+        self.payloads = payloads
+        self.bucket = TokenBucket(config.PREWARM_BUDGET_PER_MIN)
+        self.hot = []
+        self._ranked_at = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self.refreshed = 0
+        self.failed = 0
+        self.skipped_budget = 0
+
+    # ---- Control ----
+    def paused(self) -> bool:
+        return bool(config.PREWARM_PAUSE_FILE) and os.path.exists(config.PREWARM_PAUSE_FILE)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name="prewarm", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # ---- Work ----
+    def rerank(self):
+        self.hot = hot_locations(config.PREWARM_WINDOW_HOURS, config.PREWARM_TOP_N)
+        self._ranked_at = time.monotonic()
+
+    def due(self):
+        """(lat, lon, city, payload spec) entries that expire within the lead time."""
+        out = []
+        for lat, lon, city, _n in self.hot:
+            for spec in self.payloads:
+                provider, kind, _fetch, ttl = spec
+                left = self.cache.remaining(provider, kind, lat, lon, ttl)
+                lead = config.PREWARM_LEAD_SECONDS + random.uniform(0, config.PREWARM_JITTER)
+                if left is None or left <= lead:
+                    out.append((lat, lon, city, spec))
+        return out
+
+    def tick(self):
+        """One pass: re-rank if stale, then refresh what is about to expire."""
+        if time.monotonic() - self._ranked_at >= config.PREWARM_RERANK_SECONDS:
+            self.rerank()
+
+        for lat, lon, city, (provider, kind, fetch, ttl) in self.due():
+            if self._stop.is_set() or self.paused():
+                return
+            wait = self.bucket.wait_time()
+            if wait > config.PREWARM_TICK_SECONDS:
+                # Out of budget for this pass; the rest will still be due next time.
+                self.skipped_budget += 1
+                return
+            if wait and self._stop.wait(wait):
+                return
+            self.bucket.take()
+            if self.cache.refresh(provider, kind, lat, lon, fetch, ttl, city=city):
+                self.refreshed += 1
+            else:
+                self.failed += 1
+            # Spread refreshes out instead of firing them back to back.
+            self._stop.wait(random.uniform(0, config.PREWARM_JITTER) / 10)
+
+    def run(self):
+        log.info("prewarm: started (budget %s/min)", config.PREWARM_BUDGET_PER_MIN)
+        while not self._stop.is_set():
+            if not self.paused():
+                try:
+                    self.tick()
+                except Exception:
+                    # Never let one bad pass (DB locked, provider down) kill the loop.
+                    log.exception("prewarm: pass failed")
+            self._stop.wait(config.PREWARM_TICK_SECONDS + random.uniform(0, config.PREWARM_JITTER))
+        log.info("prewarm: stopped")
+
+    def stats(self) -> dict:
+        return {
+            "hot_locations": len(self.hot),
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+            "skipped_budget": self.skipped_budget,
+            "paused": self.paused(),
+        }
+
+
+def start_in_process():
+    """Start a daemon pre-warmer thread if the config asks for one."""
+    if not (config.PREWARM_ENABLED and config.PREWARM_IN_PROCESS):
+        return None
+    return Prewarmer().start()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    if not config.PREWARM_ENABLED:
+        raise SystemExit("PREWARM_ENABLED is off; set PREWARM_ENABLED=1 to run the pre-warmer.")
+    warmer = Prewarmer()
+    signal.signal(signal.SIGTERM, lambda *_: warmer._stop.set())
+    try:
+        warmer.run()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,239 @@
+# services/profiling.py
+# On-demand profiling of single live requests.
+#
+# Off unless PROFILE_ENABLED=1 (nothing is registered then, so there is no
+# per-request cost). When on, a request is profiled if:
+# - an admin (PROFILE_ADMINS) asks for it with ?_profile=sample|cprofile or
+#   an X-Profile header, or
+# - it is picked at random, PROFILE_SAMPLE_RATE of all requests, in
+#   PROFILE_MODE.
+#
+# Modes:
+# - sample: one shared background thread reads the request thread's stack
+#   every PROFILE_INTERVAL_MS (sys._current_frames) and counts identical
+#   stacks. Cheap enough for production. Saved as collapsed stacks
+#   ("a;b;c 12" lines) for flamegraph.pl or speedscope.
+# - cprofile: deterministic cProfile of the request thread, saved as a
+#   .pstats file (python -m pstats, snakeviz). Much higher overhead.
+# Work handed to the fan-out pool runs on other threads and shows up as the
+# request thread waiting on it.
+#
+# Captures go to PROFILE_DIR (shared by all workers; the newest PROFILE_KEEP
+# are kept) and the response gets an X-Profile-Id header. Admins list them at
+# /debug/profiles and download one at /debug/profiles/<id>.
+
+import cProfile
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from itertools import count
+
+from flask import abort, g, jsonify, request, send_from_directory
+from flask_login import current_user
+
+import config
+
+log = logging.getLogger(__name__)
+
+MODES = ("sample", "cprofile")
+SUFFIXES = {"sample": ".collapsed", "cprofile": ".pstats"}
+MAX_DEPTH = 128
+
+_ids = count(1)
+
+
+def is_admin() -> bool:
+    return bool(current_user.is_authenticated
+                and (getattr(current_user, "email", "") or "").lower() in config.PROFILE_ADMINS)
+
+
+class StackSampler:
+    """One daemon thread sampling every registered thread's stack."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.active = {}   # thread ident -> Counter of collapsed stacks
+        self._labels = {}  # code object -> "file.py:function"
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self, ident: int) -> Counter:
+        stacks = Counter()
+        with self._lock:
+            self.active[ident] = stacks
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return stacks
+
+    def stop(self, ident: int) -> Counter:
+        with self._lock:
+            return self.active.pop(ident, Counter())
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{os.path.basename(code.co_filename)}:{code.co_name}"
+        return label
+
+    def collapse(self, frame) -> str:
+        names = []
+        while frame is not None and len(names) < MAX_DEPTH:
+            names.append(self._label(frame.f_code))
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _run(self):
+        while True:
+            with self._lock:
+                targets = dict(self.active)
+                if not targets:
+                    self._wake.clear()
+            if not targets:
+                self._wake.wait()
+                continue
+            frames = sys._current_frames()
+            for ident, stacks in targets.items():
+                frame = frames.get(ident)
+                if frame is not None:
+                    stacks[self.collapse(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+sampler = StackSampler(config.PROFILE_INTERVAL_MS / 1000)
+
+
+class Capture:
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.started = time.perf_counter()
+        self.when = datetime.now(timezone.utc)
+        self.id = f"{self.when:%Y%m%dT%H%M%S}-{os.getpid()}-{next(_ids):05d}"
+        self.ident = threading.get_ident()
+        self.profiler = None
+        if mode == "cprofile":
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # Another profiler is active (3.12+ allows one at a time).
+                self.profiler, self.mode = None, "sample"
+        if self.mode == "sample":
+            self.stacks = sampler.start(self.ident)
+
+    def finish(self, status: int) -> dict:
+        elapsed = time.perf_counter() - self.started
+        if self.profiler is not None:
+            self.profiler.disable()
+        else:
+            self.stacks = sampler.stop(self.ident)
+        return {
+            "id": self.id,
+            "mode": self.mode,
+            "method": request.method,
+            "path": request.path,
+            "endpoint": request.endpoint,
+            "status": status,
+            "duration_ms": round(elapsed * 1000, 1),
+            "samples": sum(self.stacks.values()) if self.profiler is None else None,
+            "when": self.when.isoformat(timespec="seconds"),
+            "file": self.id + SUFFIXES[self.mode],
+        }
+
+    def save(self, meta: dict, folder: str):
+        os.makedirs(folder, exist_ok=True)
+        data_path = os.path.join(folder, meta["file"])
+        if self.profiler is not None:
+            self.profiler.dump_stats(data_path)
+        else:
+            with open(data_path, "w", encoding="utf-8") as fh:
+                for stack, n in self.stacks.most_common():
+                    fh.write(f"{stack} {n}\n")
+        # The .json goes last: listing only shows complete captures.
+        with open(os.path.join(folder, self.id + ".json"), "w", encoding="utf-8") as fh:
+            json.dump(meta, fh)
+
+
+def _requested_mode():
+    asked = request.args.get("_profile") or request.headers.get("X-Profile")
+    if asked in MODES and is_admin():
+        return asked
+    if config.PROFILE_SAMPLE_RATE and random.random() < config.PROFILE_SAMPLE_RATE:
+        return config.PROFILE_MODE if config.PROFILE_MODE in MODES else "sample"
+    return None
+
+
+def list_captures(folder: str) -> list:
+    out = []
+    try:
+        names = sorted((n for n in os.listdir(folder) if n.endswith(".json")), reverse=True)
+    except FileNotFoundError:
+        return []
+    for name in names:
+        try:
+            with open(os.path.join(folder, name), encoding="utf-8") as fh:
+                out.append(json.load(fh))
+        except (OSError, ValueError):
+            continue
+    return out
+
+
+def prune(folder: str, keep: int):
+    for meta in list_captures(folder)[keep:]:
+        for name in (meta["id"] + ".json", meta.get("file")):
+            try:
+                os.remove(os.path.join(folder, name))
+            except (OSError, TypeError):
+                pass
+
+
+def init_app(app) -> None:
+    if not config.PROFILE_ENABLED:
+        return
+    folder = os.path.join(app.root_path, config.PROFILE_DIR)
+
+    @app.before_request
+    def _start_profile():
+        mode = _requested_mode()
+        if mode:
+            g._profile = Capture(mode)
+
+    @app.after_request
+    def _finish_profile(resp):
+        capture = g.pop("_profile", None)
+        if capture is None:
+            return resp
+        meta = capture.finish(resp.status_code)
+        try:
+            capture.save(meta, folder)
+            prune(folder, config.PROFILE_KEEP)
+        except OSError:
+            log.exception("profiling: could not save %s", meta["id"])
+            return resp
+        resp.headers["X-Profile-Id"] = meta["id"]
+        return resp
+
+    @app.route("/debug/profiles")
+    def profiles():
+        if not is_admin():
+            abort(404)
+        return jsonify(list_captures(folder))
+
+    @app.route("/debug/profiles/<profile_id>")
+    def profile_download(profile_id):
+        if not is_admin():
+            abort(404)
+        meta = next((m for m in list_captures(folder) if m["id"] == profile_id), None)
+        if meta is None:
+            abort(404)
+        mimetype = "text/plain" if meta["mode"] == "sample" else "application/octet-stream"
+        return send_from_directory(folder, meta["file"], as_attachment=True, mimetype=mimetype)
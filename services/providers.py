@@ -0,0 +1,187 @@
+# services/providers.py
+# Upstream provider layer: circuit breakers, latency tracking and fallback.
+#
+# A Provider wraps one fetch function (one upstream endpoint) with:
+# - a CircuitBreaker: after PROVIDER_FAILURE_THRESHOLD failures in a row the
+#   provider is skipped for PROVIDER_RESET_SECONDS, then one probe call is let
+#   through (half-open). Success closes it again; failure re-opens it.
+# - a LatencyTracker: recent call times for /cache/stats (p50/p95/max).
+#
+# A ProviderChain tries its providers in order, skipping open circuits, within
+# one time budget (PROVIDER_BUDGET), and returns the first good payload. When
+# no circuit is closed the chain reports itself unhealthy and the cache serves
+# the last good payload as stale instead of calling out (see
+# TwoTierCache.get_or_fetch).
+
+import logging
+import threading
+import time
+from collections import deque
+
+import config
+from services.metrics import span
+
+log = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_after: float):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_after = reset_after
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_after:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {"state": self.state, "failures": self.failures, "trips": self.trips}
+
+
+class LatencyTracker:
+    """The last `window` call durations, in seconds."""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, p: float):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def stats(self) -> dict:
+        def ms(v):
+            return None if v is None else round(v * 1000, 1)
+        return {
+            "samples": len(self.samples),
+            "p50_ms": ms(self.percentile(50)),
+            "p95_ms": ms(self.percentile(95)),
+            "max_ms": ms(max(self.samples) if self.samples else None),
+        }
+
+
+class Provider:
+    """
+    One upstream endpoint. fetch(*args, timeout=seconds, **kwargs) returns a payload,
+    or None/empty on failure (exceptions count as failures too).
+    """
+
+    def __init__(self, name: str, fetch, timeout: float, breaker: CircuitBreaker = None):
+        self.name = name
+        self.fetch = fetch
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker(config.PROVIDER_FAILURE_THRESHOLD, config.PROVIDER_RESET_SECONDS)
+        self.latency = LatencyTracker()
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+
+    def call(self, *args, timeout=None, **kwargs):
+        if not self.breaker.allow():
+            self.rejected += 1
+            return None
+        self.calls += 1
+        limit = self.timeout if timeout is None else min(self.timeout, timeout)
+        started = time.monotonic()
+        try:
+            with span(f"upstream.{self.name}"):
+                result = self.fetch(*args, timeout=limit, **kwargs)
+        except Exception:
+            log.exception("provider %s: fetch raised", self.name)
+            result = None
+        self.latency.observe(time.monotonic() - started)
+        if result:
+            self.breaker.record_success()
+        else:
+            self.failures += 1
+            self.breaker.record_failure()
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "timeout": self.timeout,
+            "breaker": self.breaker.stats(),
+            "latency": self.latency.stats(),
+        }
+
+
+class ProviderChain:
+    def __init__(self, name: str, providers, budget: float = None):
+        self.name = name
+        self.providers = list(providers)
+        self.budget = config.PROVIDER_BUDGET if budget is None else budget
+        self.served = {p.name: 0 for p in self.providers}
+        self.exhausted = 0
+
+    def healthy(self) -> bool:
+        """
+        True if some provider's circuit is closed. While none is, callers with
+        a stale copy should serve it and leave the (half-open) probe calls to a
+        background refresh.
+        """
+        return any(p.breaker.state == CircuitBreaker.CLOSED for p in self.providers)
+
+    def fetch(self, *args, **kwargs):
+        """First good payload from the providers, in order, or None."""
+        deadline = time.monotonic() + self.budget
+        for provider in self.providers:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            result = provider.call(*args, timeout=left, **kwargs)
+            if result:
+                self.served[provider.name] += 1
+                return result
+        self.exhausted += 1
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "healthy": self.healthy(),
+            "budget": self.budget,
+            "served": dict(self.served),
+            "exhausted": self.exhausted,
+            "providers": {p.name: p.stats() for p in self.providers},
+        }
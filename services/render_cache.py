@@ -0,0 +1,55 @@
+# services/render_cache.py
+# Cache of rendered results pages.
+# For one location, unit, theme and local hour, mine.html renders the same
+# markup, so the bytes are kept in an LRU with a strong ETag (hash of the
+# body). The results route answers If-None-Match with 304, and the GET
+# /weather URL lets browsers and a reverse proxy reuse the response too.
+#
+# The key also holds everything else that shows up in the markup: the place
+# label, whether the visitor is logged in (nav links), and the stale flag.
+# Entries live until the end of the local hour, capped at RENDER_CACHE_TTL.
+
+import hashlib
+
+import config
+from services.cache import LRUCache, normalize_coord
+
+
+def render_key(lat, lon, temp_type, image_type, local_time, city, country, authenticated, stale):
+    return (
+        normalize_coord(lat), normalize_coord(lon), temp_type, image_type,
+        local_time.strftime("%Y-%m-%dT%H"), city, country, bool(authenticated), bool(stale),
+    )
+
+
+def seconds_left_in_hour(local_time) -> int:
+    return 3600 - (local_time.minute * 60 + local_time.second)
+
+
+def make_etag(body: bytes) -> str:
+    return hashlib.sha1(body).hexdigest()
+
+
+class RenderCache:
+    def __init__(self, max_entries: int, max_ttl: float):
+        self.pages = LRUCache(max_entries, default_ttl=max_ttl)
+        self.max_ttl = max_ttl
+
+    def get(self, key):
+        """(body, etag) or None."""
+        return self.pages.get(key)
+
+    def put(self, key, body: bytes, local_time):
+        """Store body until the end of its local hour. Returns (body, etag)."""
+        entry = (body, make_etag(body))
+        self.pages.set(key, entry, ttl=self.ttl_for(local_time))
+        return entry
+
+    def ttl_for(self, local_time) -> int:
+        return int(min(self.max_ttl, seconds_left_in_hour(local_time)))
+
+    def stats(self) -> dict:
+        return self.pages.stats()
+
+
+render_cache = RenderCache(config.RENDER_CACHE_MAX_ENTRIES, config.RENDER_CACHE_TTL)
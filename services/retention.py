@@ -0,0 +1,166 @@
+# services/retention.py
+# Archives and prunes old rows from the append-only tables.
+#
+# Every row older than its table's window (config.py, RETENTION_*_DAYS) is:
+# 1. appended to a gzipped JSON-lines file per table and UTC month,
+#    RETENTION_ARCHIVE_DIR/<table>/<YYYY-MM>.jsonl.gz (each batch is one more
+#    gzip member; gzip.open reads them back as one stream)
+# 2. deleted from the table, RETENTION_BATCH_SIZE rows per short transaction
+#    with a pause in between, so the write lock is never held for long.
+#    search_event rows are also counted into search_archive_rollup in the
+#    same transaction, so rollups.rebuild() keeps their counts.
+#
+# The file is written before the delete commits: a crash in between means
+# the next run archives those rows again, never that they are lost. Each line
+# carries the row id, so readers can drop duplicates.
+# The cache tables (weather_cache, geocode_cache) have nothing worth
+# archiving: their expired rows are just deleted.
+# SQLite doesn't shrink the file on delete; the freed pages are reused, so it
+# stops growing.
+#
+# Run it from cron (or by hand), one process at a time:
+#   python -m services.retention run [--dry-run]
+
+import gzip
+import json
+import logging
+import os
+import sys
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import select, delete, func
+
+import config
+from models_core import new_session, SearchEvent, ObservationLog
+from services.cache import PersistentCache, _utcnow
+from services.geocode_cache import geocode_cache
+from services.rollups import apply_archived
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Policy:
+    model: type
+    time_column: str
+    days: int
+    # Called with the batch's row dicts inside the delete transaction.
+    summarize: Optional[Callable] = None
+
+    @property
+    def table(self) -> str:
+        return self.model.__tablename__
+
+
+POLICIES = [
+    Policy(SearchEvent, "created_at", config.RETENTION_SEARCH_EVENT_DAYS, apply_archived),
+    Policy(ObservationLog, "rendered_at", config.RETENTION_OBSERVATION_LOG_DAYS),
+]
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"can't archive {type(value).__name__}")
+
+
+def _append_archive(folder: str, rows, time_column: str):
+    """Append rows to their month's file and fsync, before the delete commits."""
+    by_month = {}
+    for row in rows:
+        by_month.setdefault(row[time_column].strftime("%Y-%m"), []).append(row)
+    os.makedirs(folder, exist_ok=True)
+    for month, month_rows in by_month.items():
+        text = "".join(json.dumps(row, default=_json_default, separators=(",", ":")) + "\n"
+                       for row in month_rows)
+        with open(os.path.join(folder, f"{month}.jsonl.gz"), "ab") as fh:
+            fh.write(gzip.compress(text.encode("utf-8")))
+            fh.flush()
+            os.fsync(fh.fileno())
+
+
+def prune(policy: Policy, now=None, dry_run=False) -> int:
+    """Archive and delete one table's expired rows. Returns how many."""
+    if policy.days <= 0:
+        return 0
+    table = policy.model.__table__
+    column = table.c[policy.time_column]
+    cutoff = (now or _utcnow()) - timedelta(days=policy.days)
+    folder = os.path.join(os.path.dirname(os.path.abspath(config.__file__)),
+                          config.RETENTION_ARCHIVE_DIR, policy.table)
+
+    if dry_run:
+        db = new_session()
+        try:
+            return db.execute(select(func.count()).select_from(table).where(column < cutoff)).scalar_one()
+        finally:
+            db.close()
+
+    done = 0
+    while True:
+        db = new_session()
+        try:
+            # Oldest first, by the time index.
+            rows = [dict(r._mapping) for r in db.execute(
+                select(table).where(column < cutoff).order_by(column, table.c.id)
+                .limit(config.RETENTION_BATCH_SIZE)
+            )]
+            if not rows:
+                db.rollback()
+                return done
+            _append_archive(folder, rows, policy.time_column)
+            db.execute(delete(table).where(table.c.id.in_([r["id"] for r in rows])))
+            if policy.summarize:
+                policy.summarize(db, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        done += len(rows)
+        if len(rows) < config.RETENTION_BATCH_SIZE:
+            return done
+        time.sleep(config.RETENTION_BATCH_PAUSE)
+
+
+def purge_caches() -> dict:
+    """Delete expired cache rows. Returns {table: rows removed}."""
+    return {
+        # Kept while they can still be served stale.
+        "weather_cache": PersistentCache().purge_older_than(config.FORECAST_CACHE_TTL + config.CACHE_STALE_TTL),
+        "geocode_cache": geocode_cache.purge_expired(config.RETENTION_BATCH_SIZE),
+    }
+
+
+def run(dry_run=False) -> dict:
+    """
+    Apply every policy, then purge the caches (not on a dry run).
+    Returns {table: rows archived (or, dry run, expired)}.
+    """
+    report = {}
+    for policy in POLICIES:
+        report[policy.table] = prune(policy, dry_run=dry_run)
+        log.info("retention: %s %d %s rows older than %d days", "found" if dry_run else "archived",
+                 report[policy.table], policy.table, policy.days)
+    if not dry_run:
+        purged = purge_caches()
+        for table, n in purged.items():
+            log.info("retention: purged %d expired %s rows", n, table)
+        report.update(purged)
+    return report
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if not args or args[0] != "run" or set(args[1:]) - {"--dry-run"}:
+        sys.exit("usage: python -m services.retention run [--dry-run]")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    dry = "--dry-run" in args
+    archived = {policy.table for policy in POLICIES}
+    for table, n in run(dry_run=dry).items():
+        verb = "purged" if table not in archived else "would be archived" if dry else "archived"
+        print(f"{table}: {n} rows {verb}")
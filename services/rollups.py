@@ -0,0 +1,161 @@
+# services/rollups.py
+# Incrementally maintained search counters behind the /analytics page.
+# - apply_batch() bumps per-city and per-day counts for a batch of new
+#   SearchEvent rows, inside the caller's transaction (the search recorder
+#   calls it right after its multi-row INSERT).
+# - apply_archived() does the same for search_archive_rollup when
+#   services/retention.py deletes old events, so the counts survive.
+# - rebuild() recomputes both tables from search_event plus
+#   search_archive_rollup in one transaction, for first start-up or after
+#   manual edits:
+#     python -m services.rollups rebuild
+
+from collections import defaultdict
+
+from sqlalchemy import select, delete, func, insert, union_all
+
+from models_core import new_session, SearchEvent, CitySearchRollup, DailySearchRollup, SearchArchiveRollup
+
+
+def _dialect_insert(db):
+    name = db.get_bind().dialect.name
+    if name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+
+def _upsert_counts(db, model, key, rows, extra_max=None):
+    """
+    Add rows' search_count onto existing counters keyed by `key` (a column
+    name or a tuple of them), with INSERT ... ON CONFLICT DO UPDATE where the
+    dialect has it.
+    """
+    keys = key if isinstance(key, tuple) else (key,)
+    dialect_insert = _dialect_insert(db)
+    if dialect_insert is not None:
+        stmt = dialect_insert(model).values(rows)
+        updates = {"search_count": model.search_count + stmt.excluded.search_count}
+        if extra_max:
+            updates[extra_max] = stmt.excluded[extra_max]
+        db.execute(stmt.on_conflict_do_update(index_elements=list(keys), set_=updates))
+        return
+
+    # Portable fallback: read-modify-write per key.
+    for row in rows:
+        existing = db.get(model, tuple(row[k] for k in keys))
+        if existing is None:
+            db.add(model(**row))
+        else:
+            existing.search_count += row["search_count"]
+            if extra_max:
+                setattr(existing, extra_max, row[extra_max])
+
+
+def apply_batch(db, events):
+    """Fold a batch of SearchEvent row dicts (with created_at) into the rollups."""
+    per_city = defaultdict(lambda: [0, None])
+    per_day = defaultdict(int)
+    for e in events:
+        ts = e["created_at"]
+        entry = per_city[e["city"]]
+        entry[0] += 1
+        if entry[1] is None or ts > entry[1]:
+            entry[1] = ts
+        per_day[ts.date()] += 1
+
+    if per_city:
+        _upsert_counts(
+            db, CitySearchRollup, "city",
+            [{"city": c, "search_count": n, "last_searched_at": ts} for c, (n, ts) in per_city.items()],
+            extra_max="last_searched_at",
+        )
+    if per_day:
+        _upsert_counts(
+            db, DailySearchRollup, "day",
+            [{"day": d, "search_count": n} for d, n in per_day.items()],
+        )
+
+
+def apply_archived(db, events):
+    """Fold SearchEvent row dicts that are about to be deleted into search_archive_rollup."""
+    per_key = defaultdict(lambda: [0, None])
+    for e in events:
+        ts = e["created_at"]
+        entry = per_key[(ts.date(), e["city"])]
+        entry[0] += 1
+        if entry[1] is None or ts > entry[1]:
+            entry[1] = ts
+    if per_key:
+        _upsert_counts(
+            db, SearchArchiveRollup, ("day", "city"),
+            [{"day": d, "city": c, "search_count": n, "last_searched_at": ts}
+             for (d, c), (n, ts) in per_key.items()],
+            extra_max="last_searched_at",
+        )
+
+
+def rebuild():
+    """
+    Recompute both rollup tables from search_event plus the archived counts.
+    Returns the number of cities.
+    """
+    db = new_session()
+    try:
+        db.execute(delete(CitySearchRollup))
+        db.execute(delete(DailySearchRollup))
+
+        per_city = union_all(
+            select(SearchEvent.city.label("city"), func.count(SearchEvent.id).label("n"),
+                   func.max(SearchEvent.created_at).label("last"))
+            .group_by(SearchEvent.city),
+            select(SearchArchiveRollup.city, func.sum(SearchArchiveRollup.search_count),
+                   func.max(SearchArchiveRollup.last_searched_at))
+            .group_by(SearchArchiveRollup.city),
+        ).subquery()
+        db.execute(insert(CitySearchRollup).from_select(
+            ["city", "search_count", "last_searched_at"],
+            select(per_city.c.city, func.sum(per_city.c.n), func.max(per_city.c.last))
+            .group_by(per_city.c.city),
+        ))
+
+        day = func.date(SearchEvent.created_at)
+        per_day = union_all(
+            select(day.label("day"), func.count(SearchEvent.id).label("n")).group_by(day),
+            select(SearchArchiveRollup.day, func.sum(SearchArchiveRollup.search_count))
+            .group_by(SearchArchiveRollup.day),
+        ).subquery()
+        db.execute(insert(DailySearchRollup).from_select(
+            ["day", "search_count"],
+            select(per_day.c.day, func.sum(per_day.c.n)).group_by(per_day.c.day),
+        ))
+        db.commit()
+        return db.execute(select(func.count()).select_from(CitySearchRollup)).scalar_one()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def ensure_built():
+    """Build the rollups once if they are empty but there are searches (first run after upgrade)."""
+    db = new_session()
+    try:
+        has_rollups = db.execute(select(CitySearchRollup.city).limit(1)).first() is not None
+        has_events = (db.execute(select(SearchEvent.id).limit(1)).first() is not None
+                      or db.execute(select(SearchArchiveRollup.city).limit(1)).first() is not None)
+    finally:
+        db.close()
+    if has_events and not has_rollups:
+        rebuild()
+
+
+if __name__ == "__main__":
+    import sys
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python -m services.rollups rebuild")
+    print(f"Rebuilt rollups for {rebuild()} cities")
@@ -0,0 +1,146 @@
+# services/search_recorder.py
+# Write-behind recorder for SearchEvent rows.
+# The weather route only drops the event on an in-memory queue; a background
+# thread writes queued events in one multi-row INSERT once SEARCH_FLUSH_SIZE
+# events are waiting or SEARCH_FLUSH_INTERVAL seconds have passed. The request
+# path never waits on the database (or on SQLite's write lock).
+#
+# - The queue is bounded; when it is full the event is dropped and counted
+#   instead of blocking the request.
+# - Pending events are flushed at interpreter exit (atexit), which covers a
+#   normal shutdown and gunicorn's graceful worker exit.
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+import config
+from models_core import new_session, SearchEvent
+from services.cache import _utcnow
+from services.metrics import span
+from services.rollups import apply_batch
+
+log = logging.getLogger(__name__)
+
+
+class SearchRecorder:
+    def __init__(self, max_queue: int, flush_size: int, flush_interval: float):
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def _ensure_thread(self):
+        # Started lazily, and again after a fork: gunicorn workers don't
+        # inherit the master's threads.
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._stop.clear()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="search-recorder", daemon=True)
+                self._thread.start()
+
+    def record(self, **row):
+        """Queue one SearchEvent row. Never blocks; returns False if it was dropped."""
+        row.setdefault("created_at", _utcnow())
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        self._ensure_thread()
+        return True
+
+    def _take_batch(self):
+        """Block until a full batch is ready, the interval ends, or we are stopping."""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.flush_size:
+            left = deadline - time.monotonic()
+            if left <= 0 or (self._stop.is_set() and self._queue.empty()):
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(left, 0.5)))
+            except queue.Empty:
+                continue
+        return batch
+
+    def _write(self, batch):
+        db = new_session()
+        try:
+            with span("search_flush"):
+                db.execute(insert(SearchEvent).values(batch))
+                # Same transaction, so the analytics counters never drift from
+                # the event table.
+                apply_batch(db, batch)
+                db.commit()
+            self.written += len(batch)
+            self.batches += 1
+        except SQLAlchemyError:
+            db.rollback()
+            self.failed += len(batch)
+            log.exception("search recorder: dropped a batch of %d events", len(batch))
+        finally:
+            db.close()
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._take_batch()
+            if batch:
+                self._write(batch)
+
+    def flush(self):
+        """Write everything queued right now from the calling thread."""
+        while True:
+            batch = []
+            try:
+                while len(batch) < self.flush_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if not batch:
+                return
+            self._write(batch)
+
+    def close(self, timeout: float = 5.0):
+        """Stop the writer and drain the queue."""
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_max": self._queue.maxsize,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+search_recorder = SearchRecorder(
+    max_queue=config.SEARCH_QUEUE_MAX,
+    flush_size=config.SEARCH_FLUSH_SIZE,
+    flush_interval=config.SEARCH_FLUSH_INTERVAL,
+)
+atexit.register(search_recorder.close)
@@ -0,0 +1,101 @@
+# services/singleflight.py
+# Request coalescing for upstream fetches.
+# When several threads ask for the same key at once, only the first one (the
+# leader) calls the provider. The others wait for its result instead of
+# making their own round trip and spending our API quota.
+#
+# Guarantees:
+# - The leader always removes the in-flight entry and wakes the waiters,
+#   even if the fetch raises.
+# - A waiter that gives up (timeout) or sees an error always takes itself
+#   off the waiter count, so nothing is left behind in the table.
+
+import threading
+
+
+class FlightTimeout(TimeoutError):
+    pass
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.shared = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def do(self, key, fn, *args, timeout=None):
+        """
+        Call fn(*args) unless an identical call (same key) is already running,
+        in which case wait up to `timeout` seconds for its result.
+        A waiter gets the leader's exception if the leader's call raised, and
+        FlightTimeout if it waited longer than `timeout`.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.leaders += 1
+            else:
+                call.waiters += 1
+                self.shared += 1
+
+        if leader:
+            try:
+                call.result = fn(*args)
+                return call.result
+            except BaseException as e:
+                call.error = e
+                self.errors += 1
+                raise
+            finally:
+                with self._lock:
+                    if self._calls.get(key) is call:
+                        del self._calls[key]
+                call.done.set()
+
+        try:
+            if not call.done.wait(timeout):
+                self.timeouts += 1
+                raise FlightTimeout(f"{self.name}: gave up waiting for {key!r} after {timeout}s")
+        finally:
+            with self._lock:
+                call.waiters -= 1
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_flight = len(self._calls)
+            waiting = sum(c.waiters for c in self._calls.values())
+        return {
+            "in_flight": in_flight,
+            "waiting": waiting,
+            "leaders": self.leaders,
+            "shared": self.shared,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+        }
+
+
+# Shared tables: one for weather payloads (services/cache.py), one for
+# geocoding lookups (services/geocode_cache.py).
+upstream_flight = SingleFlight("upstream")
+geocode_flight = SingleFlight("geocode")
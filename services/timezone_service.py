@@ -0,0 +1,66 @@
+# services/timezone_service.py
+# Process-wide coordinate -> timezone resolution.
+# - Open-Meteo already sends the IANA zone name (we call it with timezone=auto),
+#   so when the forecast payload has it, no local lookup happens at all.
+# - Otherwise a single TimezoneFinder is loaded once per process, and the
+#   results are memoized on a rounded lat/lon grid.
+
+import threading
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from timezonefinder import TimezoneFinder
+
+import config
+
+_finder = None
+_finder_lock = threading.Lock()
+
+
+def get_finder() -> TimezoneFinder:
+    """Return the shared TimezoneFinder, loading its data on first use."""
+    global _finder
+    if _finder is None:
+        with _finder_lock:
+            if _finder is None:
+                _finder = TimezoneFinder(in_memory=config.TZ_FINDER_IN_MEMORY)
+    return _finder
+
+
+@lru_cache(maxsize=config.TZ_CACHE_SIZE)
+def _zone_name_at(lat: float, lon: float):
+    return get_finder().timezone_at(lng=lon, lat=lat)
+
+
+def zone_name_at(lat, lon):
+    """Zone name for a point, looked up once per grid cell."""
+    digits = config.TZ_GRID_DECIMALS
+    return _zone_name_at(round(float(lat), digits) + 0.0, round(float(lon), digits) + 0.0)
+
+
+@lru_cache(maxsize=None)
+def _zone(name: str) -> ZoneInfo:
+    return ZoneInfo(name)
+
+
+def resolve_timezone(lat, lon, tz_name=None) -> ZoneInfo:
+    """
+    Return the ZoneInfo for a location.
+    tz_name is the zone the provider already gave us (Open-Meteo's "timezone"
+    field). If it is present and valid, the local lookup is skipped.
+    """
+    if tz_name:
+        try:
+            return _zone(tz_name)
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+
+    name = zone_name_at(lat, lon)
+    if name is None:
+        raise ValueError("Could not determine time zone for the given location.")
+    return _zone(name)
+
+
+def cache_info() -> dict:
+    info = _zone_name_at.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "entries": info.currsize, "max_entries": info.maxsize}
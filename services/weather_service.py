@@ -1,44 +1,160 @@
-import os
 import requests
 import difflib
 from datetime import datetime
+from functools import partial
 from dotenv import load_dotenv
 import config
+from services.cache import weather_cache
+from services.fanout import imap_unordered
+from services.forecast_frame import NEEDS
+from services.forecast_query import needs, build_query
+from services.metrics import count_response
+from services.providers import Provider, ProviderChain
 
 load_dotenv()
-API_KEY = os.getenv("API_KEY")
 
 SESSION = requests.Session()
+SESSION.hooks["response"].append(count_response)
 REQUEST_KW = dict(timeout=10)
 
+# Forecast query profiles, built from what each view renders
+# (services/forecast_query.py):
+# - page: the /get_weather results page (current description, 24h strip,
+#   7-day list, today's sunrise/sunset)
+# - summary: one line per place for lists and batch lookups
+# - full: every field the app knows about, for the whole week
+_SUN = needs(daily={"sunrise", "sunset", "temperature_2m_max"}, days=1)
 
-load_dotenv()
-API_KEY = os.getenv("API_KEY")
-
-def fetch_forecast_data(lat, lon):
-    url = (
-        "https://api.open-meteo.com/v1/forecast"
-        f"?latitude={lat}&longitude={lon}"
-        "&daily=temperature_2m_max,temperature_2m_min,weathercode,sunrise,sunset,"
-        "rain_sum,precipitation_probability_max"
-        "&hourly=relative_humidity_2m,temperature_2m,weathercode"
-        "&timezone=auto"
-    )
+FORECAST_PROFILES = {
+    "page": build_query(
+        "page",
+        NEEDS["current_description"] | NEEDS["hourly_window"] | NEEDS["weekly"] | _SUN,
+    ),
+    "summary": build_query(
+        "summary",
+        NEEDS["current_description"] | _SUN
+        | needs(hourly={"temperature_2m"}, daily={"temperature_2m_min", "weathercode"}, hours=1, days=1),
+    ),
+    "full": build_query(
+        "full",
+        NEEDS["current_description"] | NEEDS["daily_humidity_means"] | NEEDS["hourly_window"]
+        | NEEDS["weekly"] | NEEDS["weekly_rain"] | _SUN
+        | needs(daily={"rain_sum"}, days=7, hourly_days=True),
+    ),
+}
+
+
+def fetch_forecast_data(lat, lon, profile="full", base_url=None, timeout=None):
+    url = FORECAST_PROFILES[profile].url(lat, lon, base_url)
     try:
-        r = SESSION.get(url, **REQUEST_KW)
+        r = SESSION.get(url, timeout=timeout or REQUEST_KW["timeout"])
         r.raise_for_status()
         return r.json()
     except requests.RequestException:
         return None
     
-def get_current_weather(lat, lon):
-    url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={API_KEY}"
+def fetch_forecast_multi(coords, profile="summary", base_url=None, timeout=None):
+    """
+    One Open-Meteo request for several (lat, lon) pairs. Returns the payloads
+    in the same order, or None if the call fails.
+    """
+    lats = ",".join(str(lat) for lat, _ in coords)
+    lons = ",".join(str(lon) for _, lon in coords)
+    url = FORECAST_PROFILES[profile].url(lats, lons, base_url)
     try:
-        r = SESSION.get(url, **REQUEST_KW)
+        r = SESSION.get(url, timeout=timeout or REQUEST_KW["timeout"])
         r.raise_for_status()
-        return r.json()
-    except requests.RequestException:
+        data = r.json()
+    except (requests.RequestException, ValueError):
         return None
+    # A single coordinate comes back as an object, several as a list.
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list) or len(data) != len(coords):
+        return None
+    return data
+
+
+# Provider chains (services/providers.py): Open-Meteo first, then any
+# configured fallback endpoints, each with its own circuit breaker.
+# The multi-location chain shares those breakers: it is the same upstream.
+_FORECAST_ENDPOINTS = [("open-meteo", None)] + [
+    (f"open-meteo-fallback-{i}", url) for i, url in enumerate(config.OPEN_METEO_FALLBACK_URLS, 1)
+]
+FORECAST_CHAIN = ProviderChain("forecast", [
+    Provider(name, partial(fetch_forecast_data, base_url=url), timeout=config.OPEN_METEO_TIMEOUT)
+    for name, url in _FORECAST_ENDPOINTS
+])
+FORECAST_MULTI_CHAIN = ProviderChain("forecast-multi", [
+    Provider(name, partial(fetch_forecast_multi, base_url=url), timeout=config.OPEN_METEO_TIMEOUT,
+             breaker=single.breaker)
+    for (name, url), single in zip(_FORECAST_ENDPOINTS, FORECAST_CHAIN.providers)
+])
+PROVIDER_CHAINS = (FORECAST_CHAIN, FORECAST_MULTI_CHAIN)
+
+
+# Cached entry points used by the routes. Each provider payload is cached
+# per normalized coordinate (and forecast profile), see services/cache.py.
+FORECAST_FETCHERS = {name: partial(FORECAST_CHAIN.fetch, profile=name) for name in FORECAST_PROFILES}
+
+
+def forecast_kind(profile: str) -> str:
+    return f"forecast.{profile}"
+
+
+def cached_forecast_data(lat, lon, profile="page"):
+    return weather_cache.get_or_fetch(
+        "open-meteo", forecast_kind(profile), lat, lon, FORECAST_FETCHERS[profile],
+        ttl=config.FORECAST_CACHE_TTL, healthy=FORECAST_CHAIN.healthy,
+    )
+
+def iter_cached_forecasts(coords, profile="summary"):
+    """
+    Forecasts for many (lat, lon) pairs, yielded as ((lat, lon), payload) as
+    soon as each is known (payload is None if it couldn't be loaded).
+    - fresh cache entries come first
+    - the misses go upstream BATCH_UPSTREAM_CHUNK at a time in one
+      multi-coordinate call each, BATCH_MAX_PARALLEL calls at once
+    - whatever a failed chunk covered (or everything, while the circuit is
+      open) goes through cached_forecast_data one by one, so it can still
+      fall back to a stale copy
+    Pass coordinates that are already deduplicated.
+    """
+    kind, ttl = forecast_kind(profile), config.FORECAST_CACHE_TTL
+    misses = []
+    for lat, lon in coords:
+        payload = weather_cache.get("open-meteo", kind, lat, lon, ttl)
+        if payload is not None:
+            yield (lat, lon), payload
+        else:
+            misses.append((lat, lon))
+
+    leftovers = misses
+    if misses and FORECAST_MULTI_CHAIN.healthy():
+        leftovers = []
+        size = max(1, config.BATCH_UPSTREAM_CHUNK)
+        chunks = [tuple(misses[i:i + size]) for i in range(0, len(misses), size)]
+        fetch = partial(FORECAST_MULTI_CHAIN.fetch, profile=profile)
+        for chunk, payloads, _error in imap_unordered(fetch, chunks, config.BATCH_MAX_PARALLEL):
+            if not payloads:
+                leftovers.extend(chunk)
+                continue
+            for (lat, lon), payload in zip(chunk, payloads):
+                weather_cache.set("open-meteo", kind, lat, lon, payload, ttl)
+                yield (lat, lon), payload
+
+    one = lambda coord: cached_forecast_data(coord[0], coord[1], profile)
+    for coord, payload, _error in imap_unordered(one, leftovers, config.BATCH_MAX_PARALLEL):
+        yield coord, payload or None
+
+
+# Everything a results page reads from the cache, as
+# (provider, kind, fetcher, ttl). The pre-warmer refreshes these: only what
+# the results page reads, so it no longer spends quota on OpenWeather.
+CACHED_PAYLOADS = (
+    ("open-meteo", forecast_kind("page"), FORECAST_FETCHERS["page"], config.FORECAST_CACHE_TTL),
+)
+
     
 def day_suffix(n: int) -> str:
     if 11 <= n % 100 <= 13:
@@ -54,7 +170,10 @@ def print_temperature(temp_k: float, temp_type: str):
         return f"{(temp_k - 273.15) * 9 / 5 + 32:.2f}°F", "fahrenheit"
     return "Invalid temperature type", "unknown"
 
-    
+
+# Row-by-row versions of the transforms. The weather page uses
+# services.forecast_frame.ForecastFrame; these stay as the reference it is
+# checked against (benchmarks/bench_forecast_frame.py).
 def organize_weekly_forecast(data, temp_type):
     forecast = []
     days = data["daily"]["time"]
@@ -93,9 +212,8 @@ def hourly_forcast_list_f(data, now_local, temp_type, num_hours=24):
     start_idx = times.index(now_str) if now_str in times else 0
 
     out = []
-    total = len(times)
-    for i in range(num_hours):
-        idx = (start_idx + i) % total
+    # Stop at the end of the axis rather than wrapping back to past hours.
+    for idx in range(start_idx, min(start_idx + num_hours, len(times))):
         t = times[idx]
         temp_k = temps[idx] + 273.15
         temp_formatted, _unit = print_temperature(temp_k, temp_type)
@@ -0,0 +1,86 @@
+# tests/test_identity_cache.py
+# The identity cache must only forget a user once the change is committed:
+# a load that runs between flush and commit sees (and caches) the old row.
+#
+#   python -m pytest tests
+
+import itertools
+import os
+import sys
+import tempfile
+
+_DB_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'identity.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+from models_core import Base, engine, new_session, User  # noqa: E402
+from services import identity_cache as cache_module  # noqa: E402
+from services.identity_cache import identity_cache  # noqa: E402
+
+Base.metadata.create_all(bind=engine)
+_emails = (f"user{n}@example.com" for n in itertools.count())
+
+
+@pytest.fixture
+def user():
+    """(id, email) of a fresh committed user, with nothing cached yet."""
+    identity_cache.users.clear()
+    db = new_session()
+    try:
+        row = User(email=next(_emails), password_hash="x")
+        db.add(row)
+        db.commit()
+        return row.id, row.email
+    finally:
+        db.close()
+
+
+def _change_email(user_id, email):
+    """Flush a new email for user_id and return the still-open session."""
+    db = new_session()
+    db.get(User, user_id).email = email
+    db.flush()
+    return db
+
+
+def test_load_between_flush_and_commit_is_dropped_at_commit(user):
+    user_id, old = user
+    db = _change_email(user_id, "new@example.com")
+    try:
+        # Another request's load_user, before the commit: still the old row.
+        assert identity_cache.get(user_id).email == old
+        db.commit()
+    finally:
+        db.close()
+    assert identity_cache.get(user_id).email == "new@example.com"
+
+
+def test_rollback_keeps_the_cached_user(user):
+    user_id, old = user
+    identity_cache.get(user_id)
+    loads = identity_cache.loads
+    db = _change_email(user_id, "never@example.com")
+    db.rollback()
+    db.close()
+    assert identity_cache.get(user_id).email == old
+    assert identity_cache.loads == loads
+
+
+def test_load_overlapping_a_commit_is_not_cached(user, monkeypatch):
+    # The load reads the old row, then the change commits before the load
+    # stores what it read: that stale copy must not be cached.
+    user_id, old = user
+    real_cached_user = cache_module.CachedUser
+
+    def commit_after_read(*args):
+        db = _change_email(user_id, "raced@example.com")
+        db.commit()
+        db.close()
+        return real_cached_user(*args)
+
+    monkeypatch.setattr(cache_module, "CachedUser", commit_after_read)
+    assert identity_cache.get(user_id).email == old
+    monkeypatch.undo()
+    assert identity_cache.get(user_id).email == "raced@example.com"